@@ -0,0 +1,534 @@
+"""
+Local stand-ins for the services the bot calls: Azure OpenAI (chat and
+embeddings), Azure AI Search, SQL Server, the service-ID API and the Bot
+Framework connector that receives replies, plus a tokenizer that needs no
+encoding download.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+from teams.ai.tokenizers import Tokenizer
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.json")
+
+# The tables MyDataSource whitelists, with the columns the corpus queries use
+TABLES = {
+    "ApplicationUsers": "Id INTEGER PRIMARY KEY, FirstName TEXT, LastName TEXT, Email TEXT",
+    "Orders": "Id INTEGER PRIMARY KEY, ServiceTeamId INTEGER NOT NULL, "
+              "TransfereeId INTEGER REFERENCES ApplicationUsers(Id), Status TEXT, CreatedDate TEXT",
+    "Children": "Id INTEGER PRIMARY KEY, OrderId INTEGER REFERENCES Orders(Id), FirstName TEXT, Age INTEGER",
+    "Pets": "Id INTEGER PRIMARY KEY, OrderId INTEGER REFERENCES Orders(Id), Name TEXT, Type TEXT",
+    "Homefindings": "Id INTEGER PRIMARY KEY, TransfereeId INTEGER REFERENCES ApplicationUsers(Id), Status TEXT",
+    "Properties": "Id INTEGER PRIMARY KEY, Address TEXT, City TEXT, Bedrooms INTEGER",
+    "HomeFindingProperties": "Id INTEGER PRIMARY KEY, HomeFindingId INTEGER REFERENCES Orders(Id), "
+                             "PropertyId INTEGER REFERENCES Properties(Id), Status TEXT",
+    "Leases": "Id INTEGER PRIMARY KEY, PropertyId INTEGER REFERENCES Properties(Id), "
+              "StartDate TEXT, EndDate TEXT, MonthlyRent REAL",
+    "TaskTypes": "Id INTEGER PRIMARY KEY, Name TEXT",
+    "Tasks": "Id INTEGER PRIMARY KEY, OrderId INTEGER REFERENCES Orders(Id), "
+             "TaskTypeId INTEGER REFERENCES TaskTypes(Id), Status TEXT, DueDate TEXT",
+    "AccountPayables": "Id INTEGER PRIMARY KEY, OrderTransactionSummaryId INTEGER REFERENCES Orders(Id), "
+                       "Amount REAL, Status TEXT",
+    "AccountReceivables": "Id INTEGER PRIMARY KEY, OrderTransactionSummaryId INTEGER REFERENCES Orders(Id), "
+                          "Amount REAL, Status TEXT",
+}
+
+FIRST_NAMES = ["Ava", "Liam", "Noah", "Emma", "Mia", "Lucas", "Zoe", "Ethan", "Nora", "Omar"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Patel", "Roger", "Kim", "Novak", "Silva", "Brown", "Khan"]
+CITIES = ["Austin", "Berlin", "Chicago", "Dublin", "London", "Madrid", "Seattle", "Toronto"]
+
+def build_database(path, orders=2000, service_teams=20, seed=7):
+    """
+    Creates a SQLite database with the 12 whitelisted tables filled with synthetic rows.
+
+    Args:
+        path (str): Database file, replaced if it exists.
+        orders (int): Number of orders; the other tables scale with it.
+        service_teams (int): ServiceTeamIds the orders are spread over, 1..service_teams.
+        seed (int): Seed of the generator, the same seed gives the same data.
+
+    Returns:
+        str: SQLAlchemy URI of the database.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    for table, columns in TABLES.items():
+        conn.execute(f"CREATE TABLE {table} ({columns})")
+
+    def date(year):
+        return f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    users = orders
+    conn.executemany("INSERT INTO ApplicationUsers VALUES (?, ?, ?, ?)", [
+        (i, first, last, f"{first}.{last}{i}@example.com".lower())
+        for i in range(1, users + 1)
+        for first, last in [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))]
+    ])
+    conn.executemany("INSERT INTO Orders VALUES (?, ?, ?, ?, ?)", [
+        (i, rng.randint(1, service_teams), i, rng.choice(["Open", "Closed", "OnHold"]), date(rng.randint(2021, 2024)))
+        for i in range(1, orders + 1)
+    ])
+    conn.executemany("INSERT INTO Children (OrderId, FirstName, Age) VALUES (?, ?, ?)", [
+        (order, rng.choice(FIRST_NAMES), rng.randint(0, 17))
+        for order in range(1, orders + 1) for _ in range(rng.randint(0, 3))
+    ])
+    conn.executemany("INSERT INTO Pets (OrderId, Name, Type) VALUES (?, ?, ?)", [
+        (order, rng.choice(["Rex", "Milo", "Luna", "Bella"]), rng.choice(["Dog", "Cat", "Bird"]))
+        for order in range(1, orders + 1) for _ in range(rng.randint(0, 2))
+    ])
+    conn.executemany("INSERT INTO Homefindings VALUES (?, ?, ?)", [
+        (i, i, rng.choice(["InProgress", "Completed", "Cancelled"])) for i in range(1, orders + 1)
+    ])
+    properties = orders * 2
+    conn.executemany("INSERT INTO Properties VALUES (?, ?, ?, ?)", [
+        (i, f"{rng.randint(1, 999)} Main Street", rng.choice(CITIES), rng.randint(1, 5))
+        for i in range(1, properties + 1)
+    ])
+    conn.executemany("INSERT INTO HomeFindingProperties (HomeFindingId, PropertyId, Status) VALUES (?, ?, ?)", [
+        (order, rng.randint(1, properties), rng.choice(["Viewed", "Shortlisted", "Rejected"]))
+        for order in range(1, orders + 1) for _ in range(rng.randint(1, 4))
+    ])
+    conn.executemany("INSERT INTO Leases (PropertyId, StartDate, EndDate, MonthlyRent) VALUES (?, ?, ?, ?)", [
+        (rng.randint(1, properties), date(2023), date(2025), round(rng.uniform(900, 6000), 2))
+        for _ in range(orders)
+    ])
+    task_types = ["Visa", "Shipment", "School search", "Temporary housing", "Tax briefing"]
+    conn.executemany("INSERT INTO TaskTypes VALUES (?, ?)", list(enumerate(task_types, start=1)))
+    conn.executemany("INSERT INTO Tasks (OrderId, TaskTypeId, Status, DueDate) VALUES (?, ?, ?, ?)", [
+        (order, rng.randint(1, len(task_types)), rng.choice(["Open", "Done"]), date(rng.randint(2023, 2025)))
+        for order in range(1, orders + 1) for _ in range(rng.randint(1, 5))
+    ])
+    for table in ("AccountPayables", "AccountReceivables"):
+        conn.executemany(f"INSERT INTO {table} (OrderTransactionSummaryId, Amount, Status) VALUES (?, ?, ?)", [
+            (order, round(rng.uniform(50, 20000), 2), rng.choice(["Open", "Paid"]))
+            for order in range(1, orders + 1) for _ in range(rng.randint(0, 3))
+        ])
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{os.path.abspath(path)}"
+
+def load_corpus(path=CORPUS_PATH):
+    """
+    Loads the scripted questions. Each entry has ``questions`` (phrasings of the
+    same question), the ``tables`` the agent looks up, the ``sql`` it runs with
+    an ``{ids}`` placeholder for the ServiceTeamIds and the ``answer`` template
+    filled with the query result.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+def _count_tokens(text):
+    # about 4 characters per token, close enough for the LLM token counters
+    return max(len(text) // 4, 1)
+
+class LocalTokenizer(Tokenizer):
+    """
+    Stands in for GPTTokenizer, which downloads the cl100k_base encoding on first
+    use. Splits text into runs of up to 4 word characters, whitespace runs and
+    single symbols, which lands close to cl100k_base counts for the corpus, and
+    keeps a vocabulary so decode(encode(text)) round-trips.
+    """
+
+    PIECES = re.compile(r"\w{1,4}|\s+|[^\w\s]")
+
+    def __init__(self):
+        self._ids = {}
+        self._pieces = []
+        self._lock = threading.Lock()
+
+    def _id(self, piece):
+        token = self._ids.get(piece)
+        if token is None:
+            with self._lock:
+                token = self._ids.setdefault(piece, len(self._pieces))
+                if token == len(self._pieces):
+                    self._pieces.append(piece)
+        return token
+
+    def encode(self, text: str) -> List[int]:
+        return [self._id(piece) for piece in self.PIECES.findall(text)]
+
+    def decode(self, tokens: List[int]) -> str:
+        return "".join(self._pieces[token] for token in tokens)
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model standing in for Azure OpenAI. For every question of the corpus
+    it replays the tool calls a well-behaved agent makes (list tables, schema,
+    check, query; only check and query when the system prompt carries a
+    schema digest) and then answers from the last tool result. Each call
+    sleeps ``latency`` seconds, plus up to ``jitter`` seconds drawn from a
+    seeded generator. Prompts without the agent's tools get the query back
+    unchanged (the query checker's fallback), or for the template fast path's
+    binding prompt, the example's values when both questions are phrasings
+    of the same corpus entry.
+    """
+
+    corpus: List[Dict[str, Any]]
+    latency: float = 0.05
+    jitter: float = 0.0
+    seed: int = 7
+    calls: int = 0
+
+    _scripts: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._scripts = {
+            _normalize(question): entry for entry in self.corpus for question in entry["questions"]
+        }
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _delay(self):
+        self.calls += 1
+        return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _script(self, messages):
+        question = next((m.content for m in messages if isinstance(m, HumanMessage)), "")
+        return self._scripts.get(_normalize(question)) or self.corpus[0]
+
+    @staticmethod
+    def _service_team_ids(messages):
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        match = re.search(r"ServiceTeamId IN (\[[^\]]*\])", system)
+        ids = match.group(1) if match else "[]"
+        return "(" + ids[1:-1] + ")"
+
+    @staticmethod
+    def _has_schema_digest(messages):
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        return "Tables (PK primary key" in system
+
+    @staticmethod
+    def _tool_call(step, name, args):
+        return {"id": f"call_{step}_{name}", "name": name, "args": args}
+
+    def _binding(self, prompt):
+        fields = dict(re.findall(r"^(Example question|New question|Parameters[^:]*): (.*)$", prompt, re.MULTILINE))
+        example = self._scripts.get(_normalize(fields.get("Example question", "")))
+        question = self._scripts.get(_normalize(fields.get("New question", "")))
+        parameters = json.loads(next((v for k, v in fields.items() if k.startswith("Parameters")), "[]"))
+        applies = example is not None and example is question
+        values = {parameter["name"]: parameter["example"] for parameter in parameters} if applies else {}
+        return AIMessage(content=json.dumps({"applies": applies, "values": values}))
+
+    def _reply(self, messages, tools):
+        if not tools and "Query template:" in messages[-1].content:
+            return self._binding(messages[-1].content)
+        if not tools:
+            # query checker fallback: hand the query back as checked
+            prompt = messages[-1].content
+            return AIMessage(content=prompt.split("Double check", 1)[0].strip())
+
+        script = self._script(messages)
+        sql = script["sql"].format(ids=self._service_team_ids(messages))
+        step = sum(isinstance(m, AIMessage) for m in messages)
+        plan = [
+            ("sql_db_list_tables", {"tool_input": ""}),
+            ("sql_db_schema", {"table_names": ", ".join(script["tables"])}),
+            ("sql_db_query_checker", {"query": sql}),
+            ("sql_db_query", {"query": sql}),
+        ]
+        if self._has_schema_digest(messages):
+            plan = plan[2:]
+        if step < len(plan):
+            name, args = plan[step]
+            call = self._tool_call(step, name, args)
+            return AIMessage(
+                content="",
+                tool_calls=[call],
+                additional_kwargs={"tool_calls": [{
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(args)},
+                }]},
+            )
+        results = [m.content for m in messages if isinstance(m, ToolMessage)]
+        return AIMessage(content=script["answer"].format(result=results[-1] if results else ""))
+
+    def _result(self, messages, kwargs):
+        message = self._reply(messages, kwargs.get("tools"))
+        prompt_tokens = sum(_count_tokens(str(m.content)) for m in messages)
+        completion_tokens = _count_tokens(message.content or json.dumps(message.additional_kwargs))
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage})
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages, kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages, kwargs)
+
+class HashEmbeddings(Embeddings):
+    """
+    Embeddings standing in for Azure OpenAI: hashed bag of words, so phrasings
+    sharing words land close together. Each call sleeps ``latency`` seconds.
+    """
+
+    def __init__(self, dimensions=256, latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+def few_shot_examples(corpus, embeddings):
+    """
+    Few-shot examples in the shape of the Azure AI Search index: the first
+    phrasing of every corpus entry with its SQL and vector.
+    """
+    contents = [entry["questions"][0] for entry in corpus]
+    vectors = embeddings.embed_documents(contents)
+    return [
+        {"content": content, "sqlQuery": entry["sql"], "vector": vector}
+        for content, entry, vector in zip(contents, corpus, vectors)
+    ]
+
+class LocationsStub:
+    """
+    Local HTTP server standing in for the service-ID API. Every email gets the
+    same ServiceTeamIds, after ``latency`` seconds.
+    """
+
+    def __init__(self, service_team_ids, latency=0.0):
+        self.service_team_ids = list(service_team_ids)
+        self.latency = latency
+        self.requests = 0
+        self.url = None
+        self._runner = None
+
+    async def _handle(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response([{"id": team} for team in self.service_team_ids])
+
+    async def start(self):
+        """
+        Starts the server on a free local port and returns the URL prefix the email is appended to.
+        """
+        app = web.Application()
+        app.router.add_get("/ids/{email}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/ids/"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+class ChatCompletionsStub:
+    """
+    Local HTTP server standing in for the Azure OpenAI chat completions API
+    used by the Teams AI planner. It answers with the data source's
+    ``<context>`` after ``latency`` seconds, as one response or as a stream of
+    server-sent chunks when the request asks for ``stream``.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=40):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.requests = 0
+        self.url = None
+        self._runner = None
+
+    @staticmethod
+    def _answer(messages):
+        text = "\n".join(str(message.get("content") or "") for message in messages)
+        # the prompt itself mentions an empty <context></context>, the data source's document comes last
+        contexts = [c.strip() for c in re.findall(r"<context>(.*?)</context>", text, re.S) if c.strip()]
+        return contexts[-1] if contexts else "I could not find an answer to that question."
+
+    async def _handle(self, request):
+        self.requests += 1
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        answer = self._answer(body.get("messages") or [])
+        model = request.match_info["deployment"]
+        completion_id = f"chatcmpl-{self.requests}"
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": _count_tokens(json.dumps(body)),
+                    "completion_tokens": _count_tokens(answer),
+                    "total_tokens": _count_tokens(json.dumps(body)) + _count_tokens(answer),
+                },
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        pieces = [answer[i:i + self.chunk_size] for i in range(0, len(answer), self.chunk_size)] or [""]
+        for index, piece in enumerate(pieces):
+            delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+            await response.write(self._chunk(completion_id, model, delta, None))
+        await response.write(self._chunk(completion_id, model, {}, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _chunk(completion_id, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+    async def start(self):
+        """
+        Starts the server on a free local port and returns its endpoint URL.
+        """
+        app = web.Application()
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+class ConnectorStub:
+    """
+    Local HTTP server standing in for the Bot Framework connector the bot
+    sends its replies to (the activity's ``serviceUrl``). It accepts every
+    activity and keeps counts by activity type and by reply text.
+    """
+
+    def __init__(self):
+        self.activities = Counter()
+        self.texts = Counter()
+        self.other_requests = 0
+        self.url = None
+        self._runner = None
+
+    async def _activity(self, request):
+        activity = await request.json()
+        self.activities[activity.get("type") or "unknown"] += 1
+        if activity.get("type") == "message" and activity.get("text"):
+            self.texts[activity["text"]] += 1
+        return web.json_response({"id": f"activity-{sum(self.activities.values())}"})
+
+    async def _other(self, request):
+        self.other_requests += 1
+        return web.json_response({})
+
+    async def start(self):
+        """
+        Starts the server on a free local port and returns the service URL to put in activities.
+        """
+        app = web.Application()
+        app.router.add_post("/v3/conversations/{conversation_id}/activities", self._activity)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities/{activity_id}", self._activity)
+        app.router.add_put("/v3/conversations/{conversation_id}/activities/{activity_id}", self._activity)
+        app.router.add_route("*", "/{tail:.*}", self._other)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,298 @@
+"""
+Load test of the /api/messages endpoint of src/app.py: the real aiohttp app,
+adapter, scheduler, Teams AI planner and data source run in-process, behind
+an empty BOT_ID so requests are accepted without a token, while every
+downstream service is a local stand-in (see benchmarks/fixtures.py).
+
+Usage (from the repository root, the app loads its prompts from ./src/prompts):
+    python -m benchmarks.load --requests 500 --concurrency 32
+    python -m benchmarks.load --rate 20 --requests 600 --downstream stub
+
+Without ``--rate`` a fixed number of clients send back to back (closed loop).
+With ``--rate`` requests arrive as a Poisson process at that rate (open
+loop), at most ``--concurrency`` in flight; latency is measured from the
+scheduled arrival, so time spent waiting for a client counts.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import ChatCompletionsStub, ConnectorStub, LocationsStub, load_corpus
+from benchmarks.replay import (
+    add_stand_in_arguments,
+    apply_settings,
+    install_stand_ins,
+    percentile,
+    run_quietly,
+    stand_in_settings,
+)
+
+STUB_DOCUMENT = "[(42,)]"
+
+def message_activity(text, user, conversation_type, service_url, tenant_id):
+    """
+    Builds a Teams message activity from ``user`` in their own conversation.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "type": "message",
+        "id": uuid.uuid4().hex,
+        "timestamp": now,
+        "localTimestamp": now,
+        "serviceUrl": service_url,
+        "channelId": "msteams",
+        "from": {"id": f"29:load-user-{user}", "name": f"Load User {user}", "aadObjectId": str(uuid.UUID(int=user + 1))},
+        "conversation": {
+            "id": f"a:load-conversation-{user}",
+            "conversationType": conversation_type,
+            "isGroup": conversation_type != "personal",
+            "tenantId": tenant_id,
+        },
+        "recipient": {"id": "28:benchmark-bot", "name": "Benchmark Bot"},
+        "text": text,
+        "textFormat": "plain",
+        "locale": "en-US",
+        "channelData": {"tenant": {"id": tenant_id}},
+        "entities": [{"type": "clientInfo", "locale": "en-US", "platform": "Web"}],
+    }
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a ``sleep(interval)`` wakes up.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(time.perf_counter() - started - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            "samples": len(samples),
+            "p50": percentile(samples, 0.50),
+            "p99": percentile(samples, 0.99),
+            "max": samples[-1] if samples else 0.0,
+        }
+
+async def drive(send, total, concurrency, rate, seed):
+    """
+    Calls ``send(index, scheduled_at)`` ``total`` times, closed loop with
+    ``concurrency`` clients, or at ``rate`` Poisson arrivals per second with at
+    most ``concurrency`` in flight.
+    """
+    if not rate:
+        pending = iter(range(total))
+
+        async def client():
+            for index in pending:
+                await send(index, time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return
+
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def arrival(index, scheduled_at):
+        async with slots:
+            await send(index, scheduled_at)
+
+    tasks = []
+    scheduled_at = time.perf_counter()
+    for index in range(total):
+        scheduled_at += rng.expovariate(rate)
+        await asyncio.sleep(max(scheduled_at - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(arrival(index, scheduled_at)))
+    await asyncio.gather(*tasks)
+
+async def load_test(args):
+    corpus = load_corpus(args.corpus)
+    questions = [question for entry in corpus for question in entry["questions"]]
+    random.Random(args.seed).shuffle(questions)
+
+    locations = LocationsStub(range(1, args.service_teams + 1), latency=args.locations_latency)
+    completions = ChatCompletionsStub(latency=args.completion_latency)
+    connector = ConnectorStub()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="load-")
+    settings = stand_in_settings(args, workdir, await locations.start())
+    settings.update({
+        # no app id: the adapter accepts requests without a token and replies without one
+        "APP_ID": "",
+        "APP_PASSWORD": "",
+        "AZURE_OPENAI_ENDPOINT": await completions.start(),
+        "STREAMING_ENABLED": args.streaming,
+    })
+    if args.downstream == "stub":
+        settings["LOCAL_RETRIEVAL_ENABLED"] = False
+    service_url = await connector.start()
+    config = apply_settings(settings)
+
+    from src import app as server
+    from src.scheduler import BUSY_MESSAGE
+
+    data_source = server.my_data_source
+    if args.downstream == "pipeline":
+        await install_stand_ins(data_source, corpus, args)
+    else:
+        async def render_data(context, memory, tokenizer, maxTokens):
+            await asyncio.sleep(args.stub_latency)
+            return data_source.renderDocument(STUB_DOCUMENT, tokenizer, maxTokens)
+
+        data_source.render_data = render_data
+
+    runner = web.AppRunner(server.app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    endpoint = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/api/messages"
+
+    latencies = []
+    errors = Counter()
+    monitor = LoopLagMonitor()
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as http:
+
+        async def send(index, scheduled_at):
+            activity = message_activity(
+                questions[index % len(questions)], index % args.users, args.conversation_type,
+                service_url, config.TENANT_ID,
+            )
+            try:
+                async with http.post(endpoint, json=activity) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors[f"http {response.status}"] += 1
+            except asyncio.TimeoutError:
+                errors["timeout"] += 1
+            except aiohttp.ClientError as e:
+                errors[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - scheduled_at)
+
+        monitor.start()
+        started = time.perf_counter()
+        await drive(send, args.requests, args.concurrency, args.rate, args.seed)
+        seconds = time.perf_counter() - started
+        monitor.stop()
+
+    scheduler_stats = server.scheduler.stats()
+    await runner.cleanup()
+    await completions.stop()
+    await connector.stop()
+    await locations.stop()
+
+    latencies.sort()
+    error_replies = connector.texts["The bot encountered an error or bug."]
+    failed = sum(errors.values()) + error_replies
+    return {
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "users": args.users,
+            "conversation_type": args.conversation_type,
+            "streaming": args.streaming,
+            "downstream": args.downstream,
+        },
+        "seconds": seconds,
+        "throughput": args.requests / seconds,
+        "latency": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "errors": dict(errors),
+        "error_rate": failed / args.requests,
+        "busy_replies": connector.texts[BUSY_MESSAGE],
+        "error_replies": error_replies,
+        "replies": dict(connector.activities),
+        "completions": completions.requests,
+        "loop_lag": monitor.summary(),
+        "scheduler": scheduler_stats,
+    }
+
+def report(results, out=sys.stdout):
+    latency, lag = results["latency"], results["loop_lag"]
+    print(
+        f"{results['settings']['requests']} requests in {results['seconds']:.2f}s, "
+        f"{results['throughput']:.2f} requests/s",
+        file=out,
+    )
+    print(
+        f"latency ms: p50 {latency['p50'] * 1000:.1f}, p95 {latency['p95'] * 1000:.1f}, "
+        f"p99 {latency['p99'] * 1000:.1f}, max {latency['max'] * 1000:.1f}",
+        file=out,
+    )
+    print(f"error rate: {results['error_rate']:.2%} {results['errors'] or ''}", file=out)
+    print(
+        f"replies: {results['replies']}, busy {results['busy_replies']}, "
+        f"bot errors {results['error_replies']}, completions {results['completions']}",
+        file=out,
+    )
+    print(
+        f"event-loop lag ms: p50 {lag['p50'] * 1000:.1f}, p99 {lag['p99'] * 1000:.1f}, "
+        f"max {lag['max'] * 1000:.1f} ({lag['samples']} samples)",
+        file=out,
+    )
+    scheduler = results["scheduler"]
+    print(
+        f"scheduler: admitted {scheduler['admitted']}, max queued {scheduler['max_queued']}, "
+        f"shed {scheduler['shed_full'] + scheduler['shed_timeout']}, wait p99 {scheduler['wait_p99'] * 1000:.1f} ms",
+        file=out,
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200, help="messages to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients, or the in-flight cap with --rate")
+    parser.add_argument("--rate", type=float, default=0, help="arrivals per second, 0 for a closed loop")
+    parser.add_argument("--users", type=int, default=50, help="distinct users sending the messages")
+    parser.add_argument("--conversation-type", choices=["personal", "groupChat", "channel"], default="personal")
+    parser.add_argument("--streaming", action="store_true", help="enable streamed replies in personal chats")
+    parser.add_argument("--downstream", choices=["pipeline", "stub"], default="pipeline",
+                        help="run the data source on the stand-ins, or replace it with a fixed-latency stub")
+    parser.add_argument("--stub-latency", type=float, default=0.3, help="seconds the stub data source takes")
+    parser.add_argument("--completion-latency", type=float, default=0.2, help="seconds per planner completion")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a request counts as timed out")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    add_stand_in_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_quietly(load_test(args), args.verbose)
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+"""
+Replays the question corpus through MyDataSource.render_data with every
+external service replaced by a local stand-in (see benchmarks/fixtures.py),
+and reports p50/p95/p99 latency per stage, throughput at each concurrency
+level and allocations.
+
+Usage:
+    python -m benchmarks.replay --turns 200 --concurrency 1,8,32
+    python -m benchmarks.replay --json results.json
+    python -m benchmarks.replay --baseline results.json --tolerance 0.2
+
+With ``--baseline`` the run exits with status 1 when a stage's p95 or the
+throughput at a concurrency level regressed by more than the tolerance.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import (
+    CORPUS_PATH,
+    HashEmbeddings,
+    LocalTokenizer,
+    LocationsStub,
+    ScriptedChatModel,
+    build_database,
+    few_shot_examples,
+    load_corpus,
+)
+
+# Settings Config requires that the stand-ins make irrelevant
+PLACEHOLDER_ENV = [
+    "TEAMS_APP_TENANT_ID", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_MODEL_DEPLOYMENT_NAME",
+    "AZURE_OPENAI_TEXT_MODEL_NAME", "STORAGE_ACCOUNT", "STORAGE_KEY", "STORAGE_CONTAINER",
+    "AI_SEARCH_SERVICE", "AI_SEARCH_INDEX", "AI_SEARCH_API_KEY", "AI_SEARCH_CATEGORY",
+    "AI_SEARCH_SEMANTIC_CONFIG_NAME", "AZURESEARCH_FIELDS_CONTENT", "AZURESEARCH_FIELDS_CONTENT_VECTOR",
+    "OPENAI_KEY", "OPENAI_DEPOLYMENT_ID_ADA", "OPENAI_EMBEDDING_MODEL", "SERVICEID_TOKEN",
+    "COSMOS_ACCOUNT_NAME", "COSMOS_ACCOUNT_KEY", "COSMOS_TABLE_NAME",
+]
+PLACEHOLDER_URLS = {
+    "AZURE_OPENAI_ENDPOINT": "https://benchmark.openai.azure.com",
+    "OPENAI_ENDPOINT": "https://benchmark.openai.azure.com",
+    "AI_SEARCH_ENDPOINT": "https://benchmark.search.windows.net",
+}
+# Config attribute -> environment variable, where the names differ
+ENV_NAMES = {"DB": "DATABASE_CONNECTION_STRING", "APP_ID": "BOT_ID", "APP_PASSWORD": "BOT_PASSWORD"}
+
+# Stages whose p95 moves by less than this are never reported as regressions
+MIN_REGRESSION_SECONDS = 0.002
+
+def apply_settings(settings):
+    """
+    Points the app at the stand-ins. The values go into the environment before
+    src.config is imported, and onto Config afterwards, so a developer's .env
+    (loaded with override) cannot send the benchmark to a live service.
+    """
+    for name in PLACEHOLDER_ENV:
+        os.environ.setdefault(name, "benchmark")
+    for name, url in PLACEHOLDER_URLS.items():
+        os.environ.setdefault(name, url)
+    for name, value in settings.items():
+        os.environ[ENV_NAMES.get(name, name)] = str(value).lower() if isinstance(value, bool) else str(value)
+
+    from src.config import Config
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    return Config
+
+def stand_in_settings(args, workdir, locations_url):
+    """
+    Builds the synthetic database in ``workdir`` and returns the settings pointing the app at the stand-ins.
+    """
+    db_uri = build_database(os.path.join(workdir, "benchmark.sqlite3"), orders=args.orders, seed=args.seed)
+    return {
+        "DB": db_uri,
+        "SERVICEID_TOKEN_REQUEST_URL": locations_url,
+        "USER_EMAIL_OVERRIDE": "benchmark.user@example.com",
+        "CHAT_LOG_ENABLED": False,
+        "STREAMING_ENABLED": False,
+        "TRACE_EXPORT_PATH": "",
+        "OPS_PORT": 0,
+        "LOCAL_RETRIEVAL_ENABLED": args.retrieval == "local",
+        "ANSWER_REUSE_TTL": args.answer_reuse,
+        "SQL_RESULT_CACHE_ENABLED": args.result_cache,
+        "FAST_PATH_ENABLED": args.fast_path,
+        "SCHEMA_DIGEST_ENABLED": args.schema_digest,
+        "EMBEDDING_CACHE_PATH": "",
+        "FEWSHOT_SNAPSHOT_PATH": os.path.join(workdir, "fewshot_snapshot.json"),
+        "SCHEMA_SNAPSHOT_PATH": os.path.join(workdir, "schema_catalog.json"),
+    }
+
+async def install_stand_ins(data_source, corpus, args):
+    """
+    Replaces the embeddings, the vector store and the chat model of ``data_source``
+    with the stand-ins, then builds its clients.
+    """
+    from langchain_core.vectorstores import InMemoryVectorStore
+    from src import vector_sql_search
+    from src.registry import registry
+
+    # Azure OpenAI embeddings and Azure AI Search
+    embeddings = HashEmbeddings(latency=args.embedding_latency)
+    vector_sql_search.embeddings = embeddings
+    vector_sql_search.cached_embeddings.embeddings = embeddings
+    vector_sql_search.cached_embeddings.store = None
+    examples = few_shot_examples(corpus, embeddings)
+    vector_sql_search.fewshot_index.load(examples)
+    vector_store = InMemoryVectorStore(embedding=vector_sql_search.cached_embeddings)
+    vector_store.add_texts(
+        [example["content"] for example in examples],
+        metadatas=[{"sqlQuery": example["sqlQuery"]} for example in examples],
+    )
+    registry.register("vector_store", lambda: vector_store)
+    registry.register(
+        "retriever",
+        lambda: registry.get("vector_store").as_retriever(search_kwargs={"k": vector_sql_search.TOP_K}),
+    )
+
+    # Azure OpenAI chat model, replaced before the agent is compiled
+    data_source.llm = ScriptedChatModel(
+        corpus=corpus, latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed
+    )
+    # tiktoken encoding download, for the schema digest token count
+    data_source.schema_digest._tokenizer = LocalTokenizer()
+
+    results = await registry.warm_up(["sql_database", "schema_catalog", "sql_agent", "retriever"])
+    failed = {name: result for name, result in results.items() if result is not True}
+    if failed:
+        raise RuntimeError(f"Failed to build clients: {failed}")
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+class StageRecorder:
+    """
+    Span exporter collecting the duration of every finished span by stage name.
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.errors = Counter()
+
+    def export(self, span):
+        self.durations[span.name].append(span.duration)
+        if span.error is not None:
+            self.errors[span.name] += 1
+
+    def reset(self):
+        self.durations.clear()
+        self.errors.clear()
+
+    def summary(self):
+        stages = {}
+        for name, durations in sorted(self.durations.items()):
+            durations = sorted(durations)
+            stages[name] = {
+                "count": len(durations),
+                "errors": self.errors[name],
+                "mean": sum(durations) / len(durations),
+                "p50": percentile(durations, 0.50),
+                "p95": percentile(durations, 0.95),
+                "p99": percentile(durations, 0.99),
+            }
+        return stages
+
+class Harness:
+    """
+    Builds MyDataSource on top of the stand-ins and runs turns through render_data.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.corpus = load_corpus(args.corpus)
+        self.recorder = StageRecorder()
+        self.locations = LocationsStub(range(1, args.service_teams + 1), latency=args.locations_latency)
+        self.workdir = args.workdir or tempfile.mkdtemp(prefix="replay-")
+        self.data_source = None
+        self.tokenizer = None
+
+    async def start(self):
+        args = self.args
+        url = await self.locations.start()
+        config = apply_settings(stand_in_settings(args, self.workdir, url))
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=config.WORKER_THREADS))
+
+        from src.my_data_source import MyDataSource
+        from src.tracing import tracer
+
+        tracer.add_exporter(self.recorder)
+        self.data_source = MyDataSource("benchmark")
+        await install_stand_ins(self.data_source, self.corpus, args)
+        self.tokenizer = LocalTokenizer()
+
+    async def stop(self):
+        from src.locations import close_async_session
+        await close_async_session()
+        await self.locations.stop()
+
+    def questions(self, turns):
+        phrasings = [question for entry in self.corpus for question in entry["questions"]]
+        rng = random.Random(self.args.seed)
+        sequence = []
+        while len(sequence) < turns:
+            rng.shuffle(phrasings)
+            sequence.extend(phrasings)
+        return sequence[:turns]
+
+    async def turn(self, question):
+        from botbuilder.core import TurnContext
+        from botbuilder.core.adapters import TestAdapter
+        from botbuilder.schema import Activity, ChannelAccount, ConversationAccount
+        from teams.state.memory import Memory
+
+        context = TurnContext(TestAdapter(), Activity(
+            type="message",
+            text=question,
+            from_property=ChannelAccount(id="benchmark-user"),
+            conversation=ConversationAccount(id="benchmark", conversation_type="personal"),
+        ))
+        memory = Memory()
+        memory.set("temp.input", question)
+        return await self.data_source.render_data(context, memory, self.tokenizer, self.args.max_tokens)
+
+    async def run(self, turns, concurrency):
+        """
+        Runs ``turns`` questions with ``concurrency`` turns in flight.
+
+        Returns:
+            dict: Turn count, wall time, throughput in turns per second and failed turns.
+        """
+        pending = iter(self.questions(turns))
+        failed = [0]
+
+        async def worker():
+            for question in pending:
+                result = await self.turn(question)
+                if not result.output:
+                    failed[0] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - started
+        return {"turns": turns, "seconds": seconds, "throughput": turns / seconds, "failed": failed[0]}
+
+    async def allocations(self, turns, top=10):
+        """
+        Runs ``turns`` sequential turns under tracemalloc.
+
+        Returns:
+            dict: Peak traced memory, memory retained after the turns and the
+            allocation sites that grew the most.
+        """
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await self.run(turns, 1)
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        return {
+            "turns": turns,
+            "peak_bytes": peak - baseline,
+            "peak_bytes_per_turn": (peak - baseline) / turns,
+            "retained_bytes": current - baseline,
+            "top_sites": [
+                {"site": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in diff[:top]
+            ],
+        }
+
+async def benchmark(args):
+    harness = Harness(args)
+    await harness.start()
+    try:
+        if args.warmup:
+            await harness.run(args.warmup, max(args.concurrency))
+        levels = {}
+        for concurrency in args.concurrency:
+            harness.recorder.reset()
+            run = await harness.run(args.turns, concurrency)
+            levels[str(concurrency)] = {**run, "stages": harness.recorder.summary()}
+        allocations = await harness.allocations(args.alloc_turns) if args.alloc_turns else None
+        schema_digest = harness.data_source.schema_digest.stats()
+    finally:
+        await harness.stop()
+    return {
+        "settings": {
+            "turns": args.turns,
+            "orders": args.orders,
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "retrieval": args.retrieval,
+            "answer_reuse": args.answer_reuse,
+            "result_cache": args.result_cache,
+            "fast_path": args.fast_path,
+            "schema_digest": args.schema_digest,
+            "seed": args.seed,
+        },
+        "schema_digest": schema_digest,
+        "levels": levels,
+        "allocations": allocations,
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a description of every stage p95 and throughput that regressed by more than ``tolerance``.
+    """
+    regressions = []
+    for level, current in results["levels"].items():
+        previous = baseline.get("levels", {}).get(level)
+        if previous is None:
+            continue
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"concurrency {level}: throughput {previous['throughput']:.2f} -> {current['throughput']:.2f} turns/s"
+            )
+        for stage, stats in current["stages"].items():
+            before = previous["stages"].get(stage)
+            if before is None:
+                continue
+            if stats["p95"] > before["p95"] * (1 + tolerance) and stats["p95"] - before["p95"] > MIN_REGRESSION_SECONDS:
+                regressions.append(
+                    f"concurrency {level}: {stage} p95 {before['p95'] * 1000:.1f} -> {stats['p95'] * 1000:.1f} ms"
+                )
+    return regressions
+
+def report(results, out=sys.stdout):
+    if results.get("schema_digest", {}).get("tokens"):
+        print(f"schema digest: {results['schema_digest']['tokens']} tokens", file=out)
+    for level, run in results["levels"].items():
+        print(
+            f"\nconcurrency {level}: {run['turns']} turns in {run['seconds']:.2f}s, "
+            f"{run['throughput']:.2f} turns/s, {run['failed']} failed",
+            file=out,
+        )
+        print(f"  {'stage':<28}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=out)
+        for stage, stats in run["stages"].items():
+            print(
+                f"  {stage:<28}{stats['count']:>7}{stats['errors']:>8}"
+                f"{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}",
+                file=out,
+            )
+    allocations = results.get("allocations")
+    if allocations:
+        print(
+            f"\nallocations over {allocations['turns']} turns: peak {allocations['peak_bytes'] / 1024:.0f} KiB "
+            f"({allocations['peak_bytes_per_turn'] / 1024:.1f} KiB/turn), "
+            f"retained {allocations['retained_bytes'] / 1024:.0f} KiB",
+            file=out,
+        )
+        for site in allocations["top_sites"]:
+            print(f"  {site['size_diff'] / 1024:>9.1f} KiB {site['count_diff']:>7} blocks  {site['site']}", file=out)
+
+def add_stand_in_arguments(parser):
+    """
+    Adds the options shaping the stand-ins and the app settings they run with.
+    """
+    parser.add_argument("--orders", type=int, default=2000, help="orders in the synthetic database")
+    parser.add_argument("--service-teams", type=int, default=3, help="ServiceTeamIds the stub API returns")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per chat model call")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="extra random seconds per chat model call")
+    parser.add_argument("--embedding-latency", type=float, default=0.01, help="seconds per embeddings call")
+    parser.add_argument("--locations-latency", type=float, default=0.02, help="seconds per service-ID API call")
+    parser.add_argument("--retrieval", choices=["local", "azure"], default="local",
+                        help="try the local few-shot index first, or always use the vector store")
+    parser.add_argument("--answer-reuse", type=float, default=0, help="ANSWER_REUSE_TTL, 0 runs the agent every turn")
+    parser.add_argument("--result-cache", action="store_true", help="enable the SQL result cache")
+    parser.add_argument("--no-fast-path", dest="fast_path", action="store_false",
+                        help="always run the agent, never the stored query of a close example")
+    parser.add_argument("--no-schema-digest", dest="schema_digest", action="store_false",
+                        help="leave the schema digest out of the agent prompt")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="corpus JSON file")
+    parser.add_argument("--workdir", default=None, help="directory for the database and snapshots")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's prints and logs")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=100, help="turns per concurrency level")
+    parser.add_argument("--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 8, 32],
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--warmup", type=int, default=24, help="turns run before measuring")
+    parser.add_argument("--alloc-turns", type=int, default=24, help="turns traced for allocations, 0 skips")
+    parser.add_argument("--max-tokens", type=int, default=2000, help="token budget of the rendered document")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    add_stand_in_arguments(parser)
+    return parser.parse_args(argv)
+
+def run_quietly(coroutine, verbose=False):
+    """
+    Runs ``coroutine`` to completion; unless ``verbose``, the app's per-turn prints and logs are discarded.
+    """
+    if verbose:
+        return asyncio.run(coroutine)
+    warnings.simplefilter("ignore")
+    logging.disable(logging.WARNING)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(coroutine)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_quietly(benchmark(args), args.verbose)
+    report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,27 +3,143 @@ Copyright (c) Microsoft Corporation. All rights reserved.
 Licensed under the MIT License.
 """
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from aiohttp import web
 from botbuilder.core.integration import aiohttp_error_middleware
 
-from src.bot import bot_app
+# seconds spent in each startup phase, reported by /ready
+startup_timings = {}
+_import_started = time.perf_counter()
+
+from src.bot import bot_app, my_data_source
+from src.email_extract import close_async_session as close_graph_session, email_cache
+from src.locations import close_async_session as close_locations_session, locations_cache
+from src.vector_sql_search import cached_embeddings, start_fewshot_refresh, stop_fewshot_refresh
+from src.utils import chat_log_writer
+from src.registry import registry
+from src.result_cache import query_result_cache
+from src.db import pool_monitor
+from src.scheduler import ScheduledBot, TurnScheduler
+from src.tracing import JsonLinesExporter, render_metrics, tracer
+from src.usage import usage_counters
+from src.config import Config
+
+startup_timings["imports"] = time.perf_counter() - _import_started
 
 routes = web.RouteTableDef()
+# health, stats and metrics, served only on the internal operations listener
+ops_routes = web.RouteTableDef()
+
+scheduler = TurnScheduler(
+    max_concurrent=Config.MAX_CONCURRENT_TURNS,
+    max_per_user=Config.MAX_TURNS_PER_USER,
+    max_queue=Config.TURN_QUEUE_SIZE,
+    queue_timeout=Config.TURN_QUEUE_TIMEOUT,
+)
+scheduled_bot = ScheduledBot(bot_app, scheduler)
 
 @routes.post("/api/messages")
 async def on_messages(req: web.Request) -> web.Response:
-    res = await bot_app.process(req)
+    res = await bot_app.adapter.process(req, scheduled_bot)
 
     if res is not None:
         return res
 
     return web.Response(status=HTTPStatus.OK)
 
+def is_ready():
+    return startup_timings.get("warm_up") is not None and registry.is_built("sql_agent")
+
+@ops_routes.get("/ready")
+async def on_ready(req: web.Request) -> web.Response:
+    status = HTTPStatus.OK if is_ready() else HTTPStatus.SERVICE_UNAVAILABLE
+    return web.json_response(
+        {
+            "ready": is_ready(),
+            "startup": startup_timings,
+            "clients": registry.timings,
+            "errors": registry.errors,
+        },
+        status=status,
+    )
+
+@ops_routes.get("/api/stats")
+async def on_stats(req: web.Request) -> web.Response:
+    return web.json_response(
+        {
+            "scheduler": scheduler.stats(),
+            "caches": {
+                "embeddings": cached_embeddings.stats(),
+                "locations": locations_cache.stats(),
+                "graph_email": email_cache.stats(),
+                "sql_results": query_result_cache.stats(),
+                "answers": {**my_data_source.answer_cache.stats(), "coalesced": my_data_source.coalesced},
+            },
+            "chat_log": chat_log_writer.stats(),
+            "usage": usage_counters.stats(),
+            "schema_digest": my_data_source.schema_digest.stats(),
+            "db_pool": pool_monitor.stats(),
+        }
+    )
+
+@ops_routes.get("/metrics")
+async def on_metrics(req: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain")
+
+async def warm_up():
+    """
+    Builds the registered clients in parallel once the server is accepting connections.
+    """
+    started = time.perf_counter()
+    results = await registry.warm_up()
+    startup_timings["warm_up"] = time.perf_counter() - started
+    for name, result in results.items():
+        if result is not True:
+            print(f"Warm-up of {name} failed: {result}")
+    if registry.is_built("schema_catalog"):
+        my_data_source.schema_catalog.start_watch(Config.SCHEMA_CHECK_INTERVAL)
+    breakdown = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in {**startup_timings, **registry.timings}.items())
+    print(f"Startup timings: {breakdown}")
+
+async def on_startup(app: web.Application):
+    started = time.perf_counter()
+    # sized pool for asyncio.to_thread calls (MSAL, SQLite state, client builds)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=Config.WORKER_THREADS))
+    start_fewshot_refresh()
+    if Config.TRACE_EXPORT_PATH:
+        tracer.add_exporter(JsonLinesExporter(Config.TRACE_EXPORT_PATH))
+    if Config.CHAT_LOG_ENABLED:
+        chat_log_writer.start()
+    if Config.OPS_PORT:
+        ops_runner = web.AppRunner(ops_app, access_log=None)
+        await ops_runner.setup()
+        await web.TCPSite(ops_runner, Config.OPS_HOST, Config.OPS_PORT).start()
+        app["ops_runner"] = ops_runner
+    # runs in the background so the port is bound without waiting for the clients
+    app["warm_up"] = asyncio.create_task(warm_up())
+    startup_timings["on_startup"] = time.perf_counter() - started
+
+async def on_cleanup(app: web.Application):
+    app["warm_up"].cancel()
+    if "ops_runner" in app:
+        await app["ops_runner"].cleanup()
+    stop_fewshot_refresh()
+    if registry.is_built("schema_catalog"):
+        my_data_source.schema_catalog.stop_watch()
+    await chat_log_writer.stop()
+    await close_locations_session()
+    await close_graph_session()
+    tracer.close()
+
 app = web.Application(middlewares=[aiohttp_error_middleware])
 app.add_routes(routes)
+app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
 
-from src.config import Config
+ops_app = web.Application()
+ops_app.add_routes(ops_routes)
 
 if __name__ == "__main__":
     web.run_app(app, host="localhost", port=Config.PORT)
\ No newline at end of file
@@ -13,6 +13,8 @@ from teams.state import TurnState
 from teams.feedback_loop_data import FeedbackLoopData
 
 from src.my_data_source import MyDataSource
+from src.storage import SqliteStorage
+from src.progress import PersonalStreamingPlanner
 from src.config import Config
 
 config = Config()
@@ -37,8 +39,33 @@ planner = ActionPlanner(
     ActionPlannerOptions(model=model, prompts=prompts, default_prompt="chat")
 )
 
+if config.STREAMING_ENABLED:
+    # Same model with streamed completions, so personal chats see progress and the answer as it is written
+    streaming_model = OpenAIModel(
+        AzureOpenAIModelOptions(
+            api_key=config.AZURE_OPENAI_API_KEY,
+            default_model=config.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME,
+            endpoint=config.AZURE_OPENAI_ENDPOINT,
+            stream=True,
+        )
+    )
+    planner = PersonalStreamingPlanner(
+        ActionPlanner(
+            ActionPlannerOptions(
+                model=streaming_model,
+                prompts=prompts,
+                default_prompt="chat",
+                start_streaming_message=config.STREAMING_START_MESSAGE,
+            )
+        ),
+        planner,
+    )
+
 # Define storage and application
-storage = MemoryStorage()
+if config.STATE_STORAGE == "sqlite":
+    storage = SqliteStorage(config.STATE_STORAGE_PATH, ttl=config.STATE_TTL)
+else:
+    storage = MemoryStorage()
 bot_app = Application[TurnState](
     ApplicationOptions(
         bot_app_id=config.APP_ID,
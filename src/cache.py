@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Expired entries are kept for an extra ``stale_ttl`` seconds so callers can
+    fall back to the last good value with ``get_stale`` when a refresh fails.
+    With ``max_bytes`` set, entries are also evicted to keep the total of the
+    sizes passed to ``set`` under that bound.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=0, max_bytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value if it has not expired, otherwise ``default``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not _MISSING and entry[1] + self.stale_ttl <= now:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def get_stale(self, key, default=None):
+        """
+        Returns the cached value if it is fresh or still inside the stale window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] + self.stale_ttl <= now:
+                return default
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None, size=0):
+        """
+        Stores a value, evicting the least recently used entries beyond ``maxsize``
+        (and ``max_bytes`` when set).
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._remove(key)
+                return
+            self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key, _MISSING)
+        if entry is not _MISSING:
+            self.bytes -= entry[2]
+        return entry
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._remove(key)
+        return default if entry is _MISSING else entry[0]
+
+    def pop_where(self, predicate):
+        """
+        Removes every entry whose value satisfies ``predicate`` and returns how many were removed.
+        """
+        with self._lock:
+            keys = [key for key, entry in self._data.items() if predicate(entry[0])]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current size.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+        }
+
+class SingleFlight:
+    """
+    Collapses concurrent async calls for the same key onto one in-flight task.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, func):
+        """
+        Awaits ``func()`` for the first caller of ``key``; concurrent callers share its result.
+
+        Args:
+            key: Identifies the work being done.
+            func (callable): Zero-argument coroutine function doing the work.
+
+        Returns:
+            Any: The result of ``func()``. Exceptions are raised to every caller.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield so one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def __len__(self):
+        return len(self._inflight)
@@ -5,12 +5,9 @@ Licensed under the MIT License.
 
 import os
 
-from dotenv import load_dotenv, dotenv_values
+from dotenv import load_dotenv
 
 load_dotenv(override=True)
-values_env = dotenv_values(".env")
-
-load_dotenv()
 
 class Config:
     """Bot Configuration"""
@@ -54,4 +51,104 @@ class Config:
     #cosmos db
     COSMOS_ACCOUNT_NAME = os.environ["COSMOS_ACCOUNT_NAME"]
     COSMOS_ACCOUNT_KEY = os.environ["COSMOS_ACCOUNT_KEY"]
-    COSMOS_TABLE_NAME = os.environ["COSMOS_TABLE_NAME"]
\ No newline at end of file
+    COSMOS_TABLE_NAME = os.environ["COSMOS_TABLE_NAME"]
+    CHAT_LOG_ENABLED = os.environ.get("CHAT_LOG_ENABLED", "false").lower() == "true" # stores every question, query and answer in Cosmos DB
+    CHAT_LOG_QUEUE_SIZE = int(os.environ.get("CHAT_LOG_QUEUE_SIZE", "10000")) # entities held in memory before new ones are dropped
+    CHAT_LOG_BATCH_SIZE = int(os.environ.get("CHAT_LOG_BATCH_SIZE", "100")) # entities per transaction, at most 100
+    CHAT_LOG_FLUSH_INTERVAL = float(os.environ.get("CHAT_LOG_FLUSH_INTERVAL", "2")) # seconds a partial batch waits before it is written
+
+    #local cache files (snapshots, on-disk caches)
+    CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+
+    #conversation state storage
+    STATE_STORAGE = os.environ.get("STATE_STORAGE", "memory").lower() # "memory" (single process) or "sqlite" (shared by the workers on a host)
+    STATE_STORAGE_PATH = os.environ.get("STATE_STORAGE_PATH", os.path.join(CACHE_DIR, "state.sqlite3"))
+    STATE_TTL = float(os.environ.get("STATE_TTL", "86400")) # seconds an idle conversation's state is kept
+
+    #streaming replies (personal chats only)
+    STREAMING_ENABLED = os.environ.get("STREAMING_ENABLED", "true").lower() == "true"
+    STREAMING_START_MESSAGE = os.environ.get("STREAMING_START_MESSAGE", "Working on your question…")
+
+    #tracing
+    TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "") # JSON-lines file receiving every span, empty disables
+
+    #operations endpoints (/ready, /api/stats, /metrics), served on a separate listener, never on the bot port
+    OPS_HOST = os.environ.get("OPS_HOST", "127.0.0.1")
+    OPS_PORT = int(os.environ.get("OPS_PORT", "3979")) # 0 disables the listener
+
+    #turn scheduling
+    MAX_CONCURRENT_TURNS = int(os.environ.get("MAX_CONCURRENT_TURNS", "16")) # message turns running at once per process
+    MAX_TURNS_PER_USER = int(os.environ.get("MAX_TURNS_PER_USER", "2"))
+    TURN_QUEUE_SIZE = int(os.environ.get("TURN_QUEUE_SIZE", "64")) # turns waiting for a slot before new ones are shed
+    TURN_QUEUE_TIMEOUT = float(os.environ.get("TURN_QUEUE_TIMEOUT", "10")) # seconds a turn may wait for a slot
+    WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "32")) # default executor used for blocking calls (MSAL, SQLite, client builds)
+
+    #agent budgets (per turn)
+    AGENT_MAX_STEPS = int(os.environ.get("AGENT_MAX_STEPS", "10")) # LLM calls one agent run may make
+    AGENT_MAX_TOKENS = int(os.environ.get("AGENT_MAX_TOKENS", "30000")) # prompt plus completion tokens one agent run may use
+    AGENT_DEADLINE = float(os.environ.get("AGENT_DEADLINE", "45")) # seconds one agent run may take
+    USAGE_MAX_KEYS = int(os.environ.get("USAGE_MAX_KEYS", "10000")) # users and ServiceTeamIds tracked by the usage counters
+
+    #template fast path
+    FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+    FAST_PATH_MIN_SIMILARITY = float(os.environ.get("FAST_PATH_MIN_SIMILARITY", "0.92")) # best local cosine match needed to run its stored query instead of the agent
+    FAST_PATH_MAX_PARAMETERS = int(os.environ.get("FAST_PATH_MAX_PARAMETERS", "6")) # stored queries with more parameters go to the agent
+    FAST_PATH_TIMEOUT = float(os.environ.get("FAST_PATH_TIMEOUT", "10")) # seconds for binding and running the stored query before falling back to the agent
+
+    #per-turn lookups
+    USER_EMAIL_OVERRIDE = os.environ.get("USER_EMAIL_OVERRIDE", "") # fixed email for local testing, skips the Graph lookup
+    EMAIL_LOOKUP_TIMEOUT = float(os.environ.get("EMAIL_LOOKUP_TIMEOUT", "5")) # seconds
+    LOCATIONS_TIMEOUT = float(os.environ.get("LOCATIONS_TIMEOUT", "10")) # seconds
+    RETRIEVAL_TIMEOUT = float(os.environ.get("RETRIEVAL_TIMEOUT", "10")) # seconds
+
+    #local few-shot retrieval
+    LOCAL_RETRIEVAL_ENABLED = os.environ.get("LOCAL_RETRIEVAL_ENABLED", "true").lower() == "true"
+    FEWSHOT_SNAPSHOT_PATH = os.environ.get("FEWSHOT_SNAPSHOT_PATH", os.path.join(CACHE_DIR, "fewshot_snapshot.json"))
+    FEWSHOT_REFRESH_INTERVAL = float(os.environ.get("FEWSHOT_REFRESH_INTERVAL", "3600")) # seconds
+    FEWSHOT_MAX_AGE = float(os.environ.get("FEWSHOT_MAX_AGE", "86400")) # seconds before the snapshot is considered stale
+    FEWSHOT_MIN_SIMILARITY = float(os.environ.get("FEWSHOT_MIN_SIMILARITY", "0.75")) # best local cosine match below this falls back to Azure AI Search
+    FEWSHOT_MAX_EXAMPLES = int(os.environ.get("FEWSHOT_MAX_EXAMPLES", "1000"))
+
+    #caches
+    EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+    EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3")) # empty disables the on-disk tier
+    LOCATIONS_CACHE_TTL = float(os.environ.get("LOCATIONS_CACHE_TTL", "900")) # seconds
+    LOCATIONS_CACHE_STALE_TTL = float(os.environ.get("LOCATIONS_CACHE_STALE_TTL", "3600")) # seconds a stale value may be served after an API failure
+    LOCATIONS_CACHE_MAX_SIZE = int(os.environ.get("LOCATIONS_CACHE_MAX_SIZE", "2048"))
+    GRAPH_EMAIL_CACHE_TTL = float(os.environ.get("GRAPH_EMAIL_CACHE_TTL", "86400")) # seconds
+    GRAPH_EMAIL_CACHE_MAX_SIZE = int(os.environ.get("GRAPH_EMAIL_CACHE_MAX_SIZE", "4096"))
+    GRAPH_REQUEST_TIMEOUT = float(os.environ.get("GRAPH_REQUEST_TIMEOUT", "5")) # seconds
+    ANSWER_REUSE_TTL = float(os.environ.get("ANSWER_REUSE_TTL", "30")) # seconds an answer is reused for the same question and ServiceTeamIds, 0 disables
+    ANSWER_CACHE_MAX_SIZE = int(os.environ.get("ANSWER_CACHE_MAX_SIZE", "1024"))
+    SQL_RESULT_CACHE_ENABLED = os.environ.get("SQL_RESULT_CACHE_ENABLED", "true").lower() == "true"
+    SQL_RESULT_CACHE_TTL = float(os.environ.get("SQL_RESULT_CACHE_TTL", "300")) # seconds, default per-table TTL
+    SQL_RESULT_CACHE_TABLE_TTLS = os.environ.get("SQL_RESULT_CACHE_TABLE_TTLS", "") # JSON object of table name -> TTL seconds
+    SQL_RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("SQL_RESULT_CACHE_MAX_ENTRIES", "10000"))
+    SQL_RESULT_CACHE_MAX_BYTES = int(os.environ.get("SQL_RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+    #sql connection pool
+    DB_REPLICA_URI = os.environ.get("DB_REPLICA_URI", "") # read-only replica for the agent's queries, empty uses DATABASE_CONNECTION_STRING
+    DB_READ_ONLY_INTENT = os.environ.get("DB_READ_ONLY_INTENT", "false").lower() == "true" # ApplicationIntent=ReadOnly, routes to a readable secondary (SQL Server)
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8")) # connections kept open, match DB_MAX_WORKERS
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "4")) # extra connections opened under load
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10")) # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800")) # seconds before a connection is replaced, -1 disables
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true" # test connections on checkout
+    DB_FAST_EXECUTEMANY = os.environ.get("DB_FAST_EXECUTEMANY", "false").lower() == "true" # pyodbc fast_executemany
+    DB_PACKET_SIZE = int(os.environ.get("DB_PACKET_SIZE", "0")) # TDS packet size in bytes (pyodbc), 0 uses the driver default
+
+    #sql execution
+    DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "8")) # threads used to run blocking database calls
+    SCHEMA_SNAPSHOT_PATH = os.environ.get("SCHEMA_SNAPSHOT_PATH", os.path.join(CACHE_DIR, "schema_catalog.json"))
+    SCHEMA_CHECK_INTERVAL = float(os.environ.get("SCHEMA_CHECK_INTERVAL", "3600")) # seconds between schema fingerprint checks, 0 disables
+    SCHEMA_DIGEST_ENABLED = os.environ.get("SCHEMA_DIGEST_ENABLED", "true").lower() == "true" # embed a schema summary in the agent prompt
+    SCHEMA_DIGEST_MAX_COLUMNS = int(os.environ.get("SCHEMA_DIGEST_MAX_COLUMNS", "40")) # columns listed per table in the digest
+    SCHEMA_HINT_VALUES = int(os.environ.get("SCHEMA_HINT_VALUES", "10")) # status-like columns with at most this many values have them listed, 0 disables
+    SQL_RESULT_MAX_ROWS = int(os.environ.get("SQL_RESULT_MAX_ROWS", "200")) # rows sql_db_query hands back to the agent
+    SQL_RESULT_MAX_TOKENS = int(os.environ.get("SQL_RESULT_MAX_TOKENS", "3000")) # tokens sql_db_query hands back to the agent
+    SQL_FETCH_BATCH_SIZE = int(os.environ.get("SQL_FETCH_BATCH_SIZE", "100")) # rows fetched from the cursor per round trip
+    SQL_ROW_COUNT_LIMIT = int(os.environ.get("SQL_ROW_COUNT_LIMIT", "10000")) # rows counted past the budget for the truncation marker
+    SQL_STATEMENT_TIMEOUT = float(os.environ.get("SQL_STATEMENT_TIMEOUT", "20")) # seconds a sql_db_query statement may run before it is cancelled, 0 disables
+    SQL_COST_GUARD_ENABLED = os.environ.get("SQL_COST_GUARD_ENABLED", "true").lower() == "true" # check the estimated plan before running (SQL Server only)
+    SQL_MAX_ESTIMATED_COST = float(os.environ.get("SQL_MAX_ESTIMATED_COST", "50")) # highest estimated statement cost allowed, 0 for no limit
+    SQL_MAX_ESTIMATED_ROWS = float(os.environ.get("SQL_MAX_ESTIMATED_ROWS", "5000000")) # highest estimated rows out of any plan operator, 0 for no limit
\ No newline at end of file
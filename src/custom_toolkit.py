@@ -1,6 +1,6 @@
 """Toolkit for interacting with an SQL database."""
 
-from typing import List
+from typing import List, Optional
 
 from langchain_core.caches import BaseCache as BaseCache
 from langchain_core.callbacks import Callbacks as Callbacks
@@ -24,6 +24,8 @@ from src.tools import(
     QuerySQLCheckerTool
 )
 from langchain_community.utilities.sql_database import SQLDatabase
+from src.result_cache import QueryResultCache
+from src.schema_catalog import SchemaCatalog
 
 class SQLDatabaseToolkit(BaseToolkit):
     """SQLDatabaseToolkit for interacting with SQL databases.
@@ -40,6 +42,10 @@ class SQLDatabaseToolkit(BaseToolkit):
             The SQL database.
         llm: BaseLanguageModel
             The language model (for use with QuerySQLCheckerTool)
+        catalog: Optional[SchemaCatalog]
+            Precomputed schema served by the list and schema tools instead of the database.
+        result_cache: Optional[QueryResultCache]
+            Cache of query results shared by the query tool.
 
     Instantiate:
         .. code-block:: python
@@ -86,6 +92,8 @@ class SQLDatabaseToolkit(BaseToolkit):
 
     db: SQLDatabase = Field(exclude=True)
     llm: BaseLanguageModel = Field(exclude=True)
+    catalog: Optional[SchemaCatalog] = Field(default=None, exclude=True)
+    result_cache: Optional[QueryResultCache] = Field(default=None, exclude=True)
 
     @property
     def dialect(self) -> str:
@@ -98,7 +106,7 @@ class SQLDatabaseToolkit(BaseToolkit):
 
     def get_tools(self) -> List[BaseTool]:
         """Get the tools in the toolkit."""
-        list_sql_database_tool = ListSQLDatabaseTool(db=self.db)
+        list_sql_database_tool = ListSQLDatabaseTool(db=self.db, catalog=self.catalog)
         info_sql_database_tool_description = (
             "Input to this tool is a comma-separated list of tables, output is the "
             "schema and sample rows for those tables. "
@@ -107,7 +115,7 @@ class SQLDatabaseToolkit(BaseToolkit):
             "Example Input: table1, table2, table3"
         )
         info_sql_database_tool = InfoSQLDatabaseTool(
-            db=self.db, description=info_sql_database_tool_description
+            db=self.db, catalog=self.catalog, description=info_sql_database_tool_description
         )
         query_sql_database_tool_description = (
             "Input to this tool is a detailed and correct SQL query with filtering condition, output is a "
@@ -118,7 +126,8 @@ class SQLDatabaseToolkit(BaseToolkit):
             "to query the correct table fields."
         )
         query_sql_database_tool = QuerySQLDataBaseTool(
-            db=self.db, description=query_sql_database_tool_description
+            db=self.db, catalog=self.catalog, result_cache=self.result_cache,
+            description=query_sql_database_tool_description,
         )
         query_sql_checker_tool_description = (
             "Use this tool to double check if your query is correct and have the filtering condition 'ServiceTeamId in'before executing "
@@ -0,0 +1,325 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_community.utilities.sql_database import truncate_word
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from src.config import Config
+from src.tracing import db_pool_connections, db_pool_saturation, db_pool_wait, span, sql_guard, sql_rows
+
+config = Config()
+logger = logging.getLogger(__name__)
+
+# Dedicated pool for blocking pyodbc/SQLAlchemy calls so they never run on the event loop
+db_executor = ThreadPoolExecutor(max_workers=config.DB_MAX_WORKERS, thread_name_prefix="sql-db")
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """
+    Runs a blocking database call on the database thread pool.
+
+    The caller's context variables are copied into the worker thread so
+    callbacks and run configuration keep working inside the call.
+
+    Args:
+        func (callable): The blocking function to run.
+
+    Returns:
+        Any: Whatever ``func`` returns.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+# pyodbc pre-connect attribute for the TDS packet size, in bytes
+SQL_ATTR_PACKET_SIZE = 112
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that times every checkout, including the wait for a free connection when the pool is exhausted.
+    """
+
+    monitor = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._record("timeout", time.perf_counter() - started)
+            raise
+        self._record("ok", time.perf_counter() - started)
+        return connection
+
+    def _record(self, outcome, seconds):
+        db_pool_wait.observe(outcome, seconds)
+        if self.monitor is not None:
+            self.monitor.record(outcome, seconds)
+
+class PoolMonitor:
+    """
+    Checkout waits and occupancy of the SQL connection pool, for /api/stats and /metrics.
+    """
+
+    def __init__(self, window=1000):
+        self.pool = None
+        self.route = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def attach(self, engine, route):
+        self.pool = engine.pool
+        self.route = route
+        if isinstance(self.pool, InstrumentedQueuePool):
+            self.pool.monitor = self
+        db_pool_connections.collect = self.connections
+        db_pool_saturation.collect = lambda: {self.route: self.saturation()} if self.route else {}
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += outcome == "timeout"
+            self.max_wait = max(self.max_wait, seconds)
+            self._waits.append(seconds)
+
+    def capacity(self):
+        if not isinstance(self.pool, QueuePool):
+            return 0
+        return self.pool.size() + max(self.pool._max_overflow, 0)
+
+    def connections(self):
+        if not isinstance(self.pool, QueuePool):
+            return {}
+        return {
+            "checked_out": self.pool.checkedout(),
+            "idle": self.pool.checkedin(),
+            "overflow": max(self.pool.overflow(), 0),
+            "capacity": self.capacity(),
+        }
+
+    def saturation(self):
+        capacity = self.capacity()
+        return self.pool.checkedout() / capacity if capacity else 0.0
+
+    def stats(self):
+        """
+        Returns pool occupancy and saturation, checkout and timeout counts and checkout wait percentiles in seconds.
+        """
+        with self._lock:
+            waits = sorted(self._waits)
+            counts = {"checkouts": self.checkouts, "timeouts": self.timeouts, "max_wait": self.max_wait}
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            "route": self.route,
+            **self.connections(),
+            "saturation": self.saturation() if self.pool is not None else 0.0,
+            **counts,
+            "wait_p50": percentile(0.50),
+            "wait_p95": percentile(0.95),
+            "wait_p99": percentile(0.99),
+        }
+
+pool_monitor = PoolMonitor()
+
+def _with_odbc_keywords(url, keywords):
+    """
+    Adds ODBC connection string keywords to a mssql+pyodbc URL, inside odbc_connect when the URL uses it.
+    """
+    odbc_connect = url.query.get("odbc_connect")
+    if odbc_connect:
+        extra = ";".join(f"{name}={value}" for name, value in keywords.items())
+        return url.update_query_dict({"odbc_connect": f"{odbc_connect.rstrip(';')};{extra}"})
+    return url.update_query_dict(keywords)
+
+def create_db_engine(config=Config):
+    """
+    Builds the SQLAlchemy engine for the agent's read-only queries from configuration.
+
+    Queries go to DB_REPLICA_URI when it is set, to DATABASE_CONNECTION_STRING
+    otherwise. On SQL Server over pyodbc, DB_READ_ONLY_INTENT adds
+    ApplicationIntent=ReadOnly so an availability group routes the connection
+    to a readable secondary, and DB_PACKET_SIZE and DB_FAST_EXECUTEMANY are
+    passed to the driver. Databases using a queue pool get the configured
+    size, overflow, timeout, recycle and pre-ping, and their checkouts are
+    reported by ``pool_monitor``.
+
+    Returns:
+        Engine: The engine.
+    """
+    route = "replica" if config.DB_REPLICA_URI else "primary"
+    url = make_url(config.DB_REPLICA_URI or config.DB)
+    engine_args = {}
+
+    if url.get_backend_name() == "mssql" and url.get_driver_name() == "pyodbc":
+        if config.DB_READ_ONLY_INTENT:
+            url = _with_odbc_keywords(url, {"ApplicationIntent": "ReadOnly"})
+        if config.DB_PACKET_SIZE:
+            engine_args["connect_args"] = {"attrs_before": {SQL_ATTR_PACKET_SIZE: config.DB_PACKET_SIZE}}
+        engine_args["fast_executemany"] = config.DB_FAST_EXECUTEMANY
+
+    # in-memory SQLite and similar databases use pools without a size
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        engine_args.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
+    engine_args["pool_pre_ping"] = config.DB_POOL_PRE_PING
+
+    engine = create_engine(url, **engine_args)
+    pool_monitor.attach(engine, route)
+    logger.info(f"SQL engine created for the {route} database ({url.get_backend_name()}), pool {type(engine.pool).__name__}")
+    return engine
+
+class StatementTimeout:
+    """
+    Cancels the statement running on a connection once ``seconds`` have passed.
+
+    The cancellation happens on the server: the driver's query timeout covers
+    the execute call on SQL Server (pyodbc), and a timer cancels the cursor
+    (pyodbc) or interrupts the connection (SQLite) if fetching runs past it.
+    """
+
+    def __init__(self, connection, seconds):
+        self.seconds = seconds
+        self.dbapi_connection = connection.connection.driver_connection
+        self.cursor = None
+        self.fired = False
+        self._timer = None
+        self._previous_timeout = None
+
+    def _cancel(self):
+        self.fired = True
+        try:
+            if self.cursor is not None and hasattr(self.cursor, "cancel"):
+                self.cursor.cancel()
+            elif hasattr(self.dbapi_connection, "interrupt"):
+                self.dbapi_connection.interrupt()
+        except Exception as e:
+            logger.warning(f"Failed to cancel statement: {e!r}")
+
+    def __enter__(self):
+        if not self.seconds:
+            return self
+        if hasattr(self.dbapi_connection, "timeout"):
+            # pyodbc: seconds, 0 means no timeout
+            self._previous_timeout = self.dbapi_connection.timeout
+            self.dbapi_connection.timeout = max(math.ceil(self.seconds), 1)
+        self._timer = threading.Timer(self.seconds, self._cancel)
+        self._timer.daemon = True
+        self._timer.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._previous_timeout is not None:
+            # the connection goes back to the pool
+            self.dbapi_connection.timeout = self._previous_timeout
+        return False
+
+def _timed_out(error, deadline):
+    # pyodbc reports its own query timeout as SQLSTATE HYT00
+    return deadline.fired or "HYT00" in str(getattr(error, "orig", error))
+
+def run_bounded(db, command, max_rows, max_tokens=None, count_tokens=None, batch_size=100, count_limit=10000,
+                timeout=None):
+    """
+    Executes a query and fetches its rows in batches, keeping only what fits the budgets.
+
+    Rows are formatted like SQLDatabase.run_no_throw. Once ``max_rows`` rows or
+    ``max_tokens`` tokens (measured with ``count_tokens``) have been kept, the
+    remaining rows are only counted, up to ``count_limit``, and a truncation
+    marker with the row count is appended to the result. A statement still
+    running after ``timeout`` seconds is cancelled on the server.
+
+    Args:
+        db (SQLDatabase): The database to query.
+        command (str): The SQL query.
+        max_rows (int): Maximum number of rows returned.
+        max_tokens (int): Maximum number of tokens returned, when ``count_tokens`` is given.
+        count_tokens (callable): Returns the token count of a string.
+        batch_size (int): Rows fetched from the cursor per round trip.
+        count_limit (int): Stop counting rows past this total.
+        timeout (float): Seconds the statement may run, None or 0 for no limit.
+
+    Returns:
+        str: The rows, an empty string when the statement returns none, or an error message.
+    """
+    with span("sql.execute") as current:
+        result = _run_bounded(db, command, max_rows, max_tokens, count_tokens, batch_size, count_limit, timeout, current)
+    return result
+
+def _run_bounded(db, command, max_rows, max_tokens, count_tokens, batch_size, count_limit, timeout, current):
+    rows = []
+    used_tokens = 0
+    total = 0
+    truncated = False
+    exhausted = True
+    deadline = None
+    try:
+        with db._engine.connect() as connection, StatementTimeout(connection, timeout) as deadline:
+            cursor = connection.execution_options(stream_results=True).execute(text(command))
+            deadline.cursor = cursor.cursor
+            if not cursor.returns_rows:
+                return ""
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    total += 1
+                    if truncated:
+                        continue
+                    values = tuple(truncate_word(value, length=db._max_string_length) for value in row)
+                    cost = count_tokens(str(values)) if count_tokens and max_tokens else 0
+                    if len(rows) >= max_rows or (cost and used_tokens + cost > max_tokens):
+                        truncated = True
+                        continue
+                    rows.append(values)
+                    used_tokens += cost
+                if truncated and total >= count_limit:
+                    exhausted = False
+                    break
+    except SQLAlchemyError as e:
+        if deadline is not None and _timed_out(e, deadline):
+            current.set("error", "timeout")
+            sql_guard.inc("timeout")
+            return (
+                f"Error: The query was cancelled after running for {timeout:g} seconds. "
+                "Narrow it with filters on key columns, aggregates or TOP and try again."
+            )
+        current.set("error", type(e).__name__)
+        return f"Error: {e}"
+
+    current.set("rows", total)
+    current.set("rows_returned", len(rows))
+    current.set("truncated", truncated)
+    sql_rows.observe("total", total)
+    sql_rows.observe("returned", len(rows))
+    if not rows and not truncated:
+        return ""
+    if not truncated:
+        return str(rows)
+    shown = f"{len(rows)} of {total}" if exhausted else f"{len(rows)} of more than {total}"
+    return (
+        f"{rows}\n[Result truncated: showing {shown} rows. "
+        "Use filters, aggregates or TOP to narrow the query if the answer needs the remaining rows.]"
+    )
@@ -1,19 +1,95 @@
+import asyncio
+import threading
+import time
+import aiohttp
 import requests
 import traceback
+from src.cache import SingleFlight, TTLCache
 from src.config import Config
+from src.registry import registry
 from msal import ConfidentialClientApplication
 
 config = Config()
 
-# Initialize MSAL authentication client
+# Initialize MSAL authentication client on first use, its construction fetches the tenant's OpenID configuration
 # This will enable application to generate token on behalf of user
-auth_app = ConfidentialClientApplication(
-    client_id=config.APP_ID,
-    client_credential=config.APP_PASSWORD,
-    authority=f"https://login.microsoftonline.com/{config.TENANT_ID}",
-)
+def _build_auth_app():
+    return ConfidentialClientApplication(
+        client_id=config.APP_ID,
+        client_credential=config.APP_PASSWORD,
+        authority=f"https://login.microsoftonline.com/{config.TENANT_ID}",
+    )
 
-# this function extracts email of the user who is currently using the bot 
+registry.register("msal", _build_auth_app)
+
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+GRAPH_USERS_URL = "https://graph.microsoft.com/v1.0/users"
+TOKEN_REFRESH_SKEW = 300  # seconds before expiry at which the app token is renewed
+
+# Pooled session for the sync path
+session = requests.Session()
+
+# aiohttp session used by the async path, created on first use inside the event loop
+async_session = None
+
+# AAD object id -> email; a user's mail address practically never changes
+email_cache = TTLCache(maxsize=config.GRAPH_EMAIL_CACHE_MAX_SIZE, ttl=config.GRAPH_EMAIL_CACHE_TTL)
+email_flight = SingleFlight()
+
+# App token reused until close to expiry
+_token = {"access_token": None, "expires_at": 0.0}
+_token_lock = threading.Lock()
+token_flight = SingleFlight()
+
+def _get_async_session():
+    global async_session
+    if async_session is None or async_session.closed:
+        async_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=config.GRAPH_REQUEST_TIMEOUT)
+        )
+    return async_session
+
+async def close_async_session():
+    """
+    Closes the aiohttp session used by aget_user_email.
+    """
+    if async_session is not None and not async_session.closed:
+        await async_session.close()
+
+def _cached_token():
+    if _token["access_token"] and time.time() < _token["expires_at"] - TOKEN_REFRESH_SKEW:
+        return _token["access_token"]
+    return None
+
+def _acquire_token():
+    """
+    Returns the cached Graph app token, acquiring a new one when it is missing or about to expire.
+    """
+    with _token_lock:
+        access_token = _cached_token()
+        if access_token:
+            return access_token
+
+        #our authenticated app is now acquiring access token for the client
+        token_response = registry.get("msal").acquire_token_for_client(
+            scopes=GRAPH_SCOPES
+        )
+
+        if not token_response or "access_token" not in token_response:
+            print("[ERROR] Failed to obtain Graph API access token.")
+            return None
+
+        _token["access_token"] = token_response["access_token"]
+        _token["expires_at"] = time.time() + int(token_response.get("expires_in", 0))
+        return _token["access_token"]
+
+async def _aacquire_token():
+    access_token = _cached_token()
+    if access_token:
+        return access_token
+    return await token_flight.do("graph", lambda: asyncio.to_thread(_acquire_token))
+
+# this function extracts email of the user who is currently using the bot
 def get_user_email(context):
     """
     Extracts the user's email from Microsoft Graph API using their AAD Object ID.
@@ -24,34 +100,75 @@ def get_user_email(context):
         if not user_aad_id:
             print("[ERROR] No AAD Object ID found in message.")
             return None
-        #step 2: acquire token
-        #our authenticated app is now acquiring access token for the client
-        token_response = auth_app.acquire_token_for_client(
-            scopes=["https://graph.microsoft.com/.default"]
-        )
 
-        if not token_response or "access_token" not in token_response:
-            print("[ERROR] Failed to obtain Graph API access token.")
-            return None
+        user_email = email_cache.get(user_aad_id)
+        if user_email:
+            return user_email
 
-        access_token = token_response["access_token"]
+        #step 2: acquire token
+        access_token = _acquire_token()
+        if not access_token:
+            return None
 
         # Step 3: Fetch user email from Microsoft Graph using AAD Object ID
         headers = {"Authorization": f"Bearer {access_token}"}
-        graph_url = f"https://graph.microsoft.com/v1.0/users/{user_aad_id}"
+        graph_url = f"{GRAPH_USERS_URL}/{user_aad_id}"
 
-        response = requests.get(graph_url, headers=headers)
+        response = session.get(graph_url, headers=headers, timeout=config.GRAPH_REQUEST_TIMEOUT)
 
         if response.status_code == 200:
             user_data = response.json()
-            user_email = user_data.get("mail", "Email not found")
+            user_email = user_data.get("mail")
+            if user_email:
+                email_cache.set(user_aad_id, user_email)
             # print(f"[INFO] Retrieved User Email: {user_email}")
-            return user_email
+            return user_email or "Email not found"
         else:
-            print(f"[ERROR] Failed to fetch user info. Status: {response.status_code}, Response: {response.json()}")
+            print(f"[ERROR] Failed to fetch user info. Status: {response.status_code}, Response: {response.text}")
             return None
 
     except Exception as e:
         print(f"[ERROR] Exception in get_user_email: {e}")
         traceback.print_exc()
         return None
+
+async def _afetch_user_email(user_aad_id):
+    access_token = await _aacquire_token()
+    if not access_token:
+        return None
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    graph_url = f"{GRAPH_USERS_URL}/{user_aad_id}"
+
+    async with _get_async_session().get(graph_url, headers=headers) as response:
+        if response.status == 200:
+            user_data = await response.json()
+            user_email = user_data.get("mail")
+            if user_email:
+                email_cache.set(user_aad_id, user_email)
+            return user_email or "Email not found"
+        print(f"[ERROR] Failed to fetch user info. Status: {response.status}, Response: {await response.text()}")
+        return None
+
+async def aget_user_email(context):
+    """
+    Async version of get_user_email. MSAL is synchronous, so the token request
+    runs in a worker thread while the Graph call uses aiohttp. Users already
+    seen are answered from the cache without any Graph round trip.
+    """
+    try:
+        user_aad_id = getattr(context.activity.from_property, "aad_object_id", None)
+        if not user_aad_id:
+            print("[ERROR] No AAD Object ID found in message.")
+            return None
+
+        user_email = email_cache.get(user_aad_id)
+        if user_email:
+            return user_email
+
+        return await email_flight.do(user_aad_id, lambda: _afetch_user_email(user_aad_id))
+
+    except Exception as e:
+        print(f"[ERROR] Exception in aget_user_email: {e}")
+        traceback.print_exc()
+        return None
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from src.cache import TTLCache
+
+def normalize_text(text):
+    """
+    Normalizes a query so trivially different phrasings (case, whitespace) share a cache entry.
+    """
+    return " ".join(text.lower().split())
+
+class EmbeddingStore:
+    """
+    SQLite-backed store of float32 query vectors.
+
+    The database runs in WAL mode so several worker processes can share the
+    same file, and it survives restarts.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def set(self, key, model, vector):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, array("f", vector).tobytes(), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with a two-tier query cache: an in-memory LRU
+    in front of an optional on-disk EmbeddingStore. Keys combine the model
+    name with the normalized query text. Document embedding is passed through.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, memory_size: int = 4096, path: str = ""):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory = TTLCache(maxsize=memory_size, ttl=float("inf"))
+        self.store = EmbeddingStore(path) if path else None
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _from_store(self, key):
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(key)
+        except sqlite3.Error as e:
+            print(f"Embedding cache read failed: {e}")
+            return None
+
+    def _to_store(self, key, vector):
+        if self.store is None:
+            return
+        try:
+            self.store.set(key, self.model_name, vector)
+        except sqlite3.Error as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        vector = self._from_store(key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            vector = self.embeddings.embed_query(text)
+            self._to_store(key, vector)
+
+        self.memory.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        vector = await asyncio.to_thread(self._from_store, key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._to_store, key, vector)
+
+        self.memory.set(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self):
+        """
+        Returns per-tier hit counters and the overall hit rate.
+        """
+        memory_hits = self.memory.hits
+        lookups = memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+        }
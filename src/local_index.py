@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+RRF_K = 60  # reciprocal rank fusion constant, same default Azure AI Search uses for hybrid queries
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+def _ranks(scores):
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+    return ranks
+
+class FewShotIndex:
+    """
+    In-process hybrid index over the few-shot SQL examples.
+
+    Vectors are held in a normalized float32 matrix for cosine top-k, and a
+    BM25 keyword score over the question text approximates the keyword half of
+    Azure AI Search's semantic hybrid ranking. Both rankings are merged with
+    reciprocal rank fusion.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.examples = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.loaded_at = 0.0
+        self._postings = {}
+        self._idf = {}
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.examples)
+
+    def load(self, examples):
+        """
+        Replaces the corpus.
+
+        Args:
+            examples (list): Dicts with ``content`` (question text), ``sqlQuery`` and ``vector``.
+        """
+        examples = [e for e in examples if e.get("vector") and e.get("sqlQuery")]
+        matrix = np.asarray([e["vector"] for e in examples], dtype=np.float32).reshape(len(examples), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        postings = {}
+        doc_lengths = np.zeros(len(examples), dtype=np.float32)
+        for i, example in enumerate(examples):
+            terms = Counter(tokenize(example.get("content", "")))
+            doc_lengths[i] = sum(terms.values())
+            for term, tf in terms.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(tf)
+        postings = {term: (np.asarray(docs), np.asarray(tfs, dtype=np.float32)) for term, (docs, tfs) in postings.items()}
+        n = len(examples)
+        idf = {term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, (docs, _) in postings.items()}
+
+        with self._lock:
+            self.examples = examples
+            self.matrix = matrix
+            self._postings = postings
+            self._idf = idf
+            self._doc_lengths = doc_lengths
+            self.loaded_at = time.time()
+
+    def is_stale(self, max_age):
+        return not self.examples or time.time() - self.loaded_at > max_age
+
+    def _bm25(self, query, doc_lengths):
+        scores = np.zeros(len(doc_lengths), dtype=np.float32)
+        if not len(doc_lengths):
+            return scores
+        avg_length = doc_lengths.mean() or 1.0
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            docs, tfs = self._postings[term]
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / avg_length)
+            scores[docs] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query, query_vector, k=3):
+        """
+        Returns the top ``k`` examples for a query.
+
+        Args:
+            query (str): The question text, used for the keyword score.
+            query_vector (list): The question embedding.
+            k (int): Number of examples to return.
+
+        Returns:
+            list: Dicts with ``sqlQuery``, ``content``, the fused ``score`` and
+            the cosine ``similarity`` of each match, best first.
+        """
+        with self._lock:
+            examples, matrix, doc_lengths = self.examples, self.matrix, self._doc_lengths
+            if not examples:
+                return []
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            similarities = matrix @ vector
+            keyword_scores = self._bm25(query, doc_lengths)
+
+        # documents without keyword overlap get no keyword contribution
+        fused = 1.0 / (RRF_K + _ranks(similarities))
+        fused += np.where(keyword_scores > 0, 1.0 / (RRF_K + _ranks(keyword_scores)), 0.0)
+
+        k = min(k, len(examples))
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.argsort(-fused[top])]
+        return [
+            {
+                "content": examples[i].get("content", ""),
+                "sqlQuery": examples[i]["sqlQuery"],
+                "score": float(fused[i]),
+                "similarity": float(similarities[i]),
+            }
+            for i in top
+        ]
+
+    def save(self, path):
+        """
+        Writes the corpus to a JSON snapshot file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "examples": self.examples}, f)
+        os.replace(tmp_path, path)
+
+    def load_file(self, path):
+        """
+        Loads the corpus from a JSON snapshot file. Returns False when the file does not exist.
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        self.load(snapshot.get("examples", []))
+        self.loaded_at = snapshot.get("saved_at", self.loaded_at)
+        return True
@@ -1,18 +1,33 @@
+import asyncio
+import aiohttp
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from src.cache import SingleFlight, TTLCache
 from src.config import Config
 
 config = Config()
 
+RETRY_TOTAL = 5
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+REQUEST_TIMEOUT = 5  # seconds, to avoid hanging requests
+# The async retries give up early enough for the stale-cache fallback to answer within LOCATIONS_TIMEOUT
+RETRY_DEADLINE = 0.8 * config.LOCATIONS_TIMEOUT  # seconds
+
+HEADERS = {
+    'Token': config.SERVICEID_TOKEN,
+    'Content-Type': 'application/json'
+}
+
 # Create a session for connection reuse
 session = requests.Session()
 
 # Define your retry strategy
 retry_strategy = Retry(
-    total=5, 
-    backoff_factor=0.5, 
-    status_forcelist=[400, 401, 402, 403, 404, 500, 502, 503, 504],
+    total=RETRY_TOTAL,
+    backoff_factor=RETRY_BACKOFF_FACTOR,
+    status_forcelist=RETRY_STATUS_CODES,
     allowed_methods=["GET"]
 )
 
@@ -21,14 +36,84 @@ adapter = HTTPAdapter(max_retries=retry_strategy)
 session.mount("http://", adapter)
 session.mount("https://", adapter)
 
-session.headers.update({
-    'Token': config.SERVICEID_TOKEN,
-    'Content-Type': 'application/json'
-})
+session.headers.update(HEADERS)
+
+# ServiceTeamIds change rarely, so cache them per email
+locations_cache = TTLCache(
+    maxsize=config.LOCATIONS_CACHE_MAX_SIZE,
+    ttl=config.LOCATIONS_CACHE_TTL,
+    stale_ttl=config.LOCATIONS_CACHE_STALE_TTL,
+)
+locations_flight = SingleFlight()
+
+# aiohttp session used by the async path, created on first use inside the event loop
+async_session = None
+
+def _get_async_session():
+    global async_session
+    if async_session is None or async_session.closed:
+        async_session = aiohttp.ClientSession(
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        )
+    return async_session
+
+async def close_async_session():
+    """
+    Closes the aiohttp session used by aautherized_locations.
+    """
+    if async_session is not None and not async_session.closed:
+        await async_session.close()
+
+def _fetch_locations(email):
+    url = f'{config.SERVICEID_TOKEN_REQUEST_URL}{email}'
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return [location['id'] for location in response.json()]
+
+async def _afetch_locations(email):
+    url = f'{config.SERVICEID_TOKEN_REQUEST_URL}{email}'
+    http = _get_async_session()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RETRY_DEADLINE
+
+    for attempt in range(RETRY_TOTAL + 1):
+        remaining = deadline - loop.time()
+        delay = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        try:
+            timeout = aiohttp.ClientTimeout(total=min(REQUEST_TIMEOUT, remaining))
+            async with http.get(url, timeout=timeout) as response:
+                retry = attempt < RETRY_TOTAL and deadline - loop.time() > delay
+                if response.status in RETRY_STATUS_CODES and retry:
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()
+                return [location['id'] for location in await response.json(content_type=None)]
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == RETRY_TOTAL or deadline - loop.time() <= delay:
+                raise
+            await asyncio.sleep(delay)
+
+def _cached_or_empty(key, error):
+    # Serve the last good value for a bounded time instead of locking the user out
+    stale = locations_cache.get_stale(key)
+    if stale is not None:
+        print(f"API request failed, serving cached locations: {error}")
+        return stale
+    print(f"API request failed: {error}")
+    return []
+
+def stale_locations(email):
+    """
+    The last good location IDs for the email within LOCATIONS_CACHE_STALE_TTL, or an empty list.
+    """
+    return locations_cache.get_stale(email.lower()) or []
 
 def autherized_locations(email):
     """
     Fetches location IDs for the given email from the service efficiently.
+    Results are cached per email for LOCATIONS_CACHE_TTL seconds.
 
     Args:
         email (str): The email of the user.
@@ -36,14 +121,44 @@ def autherized_locations(email):
     Returns:
         list: A list of location IDs.
     """
-    url = f'{config.SERVICEID_TOKEN_REQUEST_URL}{email}'
+    key = email.lower()
+    cached = locations_cache.get(key)
+    if cached is not None:
+        return cached
 
     try:
-        response = session.get(url, timeout=5)  # Set a timeout to avoid hanging requests
-        response.raise_for_status() 
-        return [location['id'] for location in response.json()]
+        locations = _fetch_locations(email)
 
     except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
-        return []
+        return _cached_or_empty(key, e)
+
+    if locations:
+        locations_cache.set(key, locations)
+    return locations
+
+async def aautherized_locations(email):
+    """
+    Async version of autherized_locations that does not block the event loop.
+    Uses the same retry policy as the sync session and shares the cache;
+    concurrent misses for the same email share one request.
+
+    Args:
+        email (str): The email of the user.
+
+    Returns:
+        list: A list of location IDs.
+    """
+    key = email.lower()
+    cached = locations_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        locations = await locations_flight.do(key, lambda: _afetch_locations(email))
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return _cached_or_empty(key, e)
 
+    if locations:
+        locations_cache.set(key, locations)
+    return locations
@@ -1,20 +1,38 @@
+import asyncio
 import json
 import logging
 from dataclasses import dataclass
+from typing import Any, List, Optional
 from langchain_community.utilities import SQLDatabase
+from langchain_core.messages import SystemMessage
 from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from langgraph.prebuilt.chat_agent_executor import AgentState
 from teams.ai.tokenizers import Tokenizer
 from teams.ai.data_sources import DataSource
 from teams.state.state import TurnContext
 from teams.state.memory import Memory
 from langchain_community.callbacks import get_openai_callback
 from src.custom_toolkit import SQLDatabaseToolkit
+from src.schema_catalog import SchemaCatalog
+from src.schema_digest import SchemaDigest
+from src.result_cache import query_result_cache
+from src.registry import registry
+from src.cache import SingleFlight, TTLCache
+from src.embedding_cache import normalize_text
  
-from src.email_extract import get_user_email
-from src.vector_sql_search import retrieve_docs
-from src.locations import autherized_locations
-from src.sqlagentprompt import SQL_AGENT_PROMPT
+from src.email_extract import aget_user_email
+from src.vector_sql_search import aretrieve_examples, sample_queries
+from src.locations import aautherized_locations, stale_locations
+from src.utils import store_chat_in_cosmos
+from src.progress import TOOL_STATUS, progress_reporter
+from src.tracing import budget_exceeded, fast_path, span, start_span, tracing_handler
+from src.usage import usage_counters, user_key
+from src.sqlagentprompt import SQL_AGENT_PROMPT, SQL_AGENT_PROMPT_NO_DIGEST
+from src.query_prompt import TEMPLATE_BINDING_PROMPT
+from src.sql_template import bind, parameterize, slot_descriptions
+from src.sql_validator import OK, validate_query
+from src.db import create_db_engine, run_in_db_executor
 from src.config import Config
  
 # Configure logging
@@ -28,6 +46,49 @@ class Result:
     output: str
     length: int
     too_long: bool
+
+def answer_key(query, service_team_ids):
+    """
+    Identifies a question for coalescing: the normalized text plus the set of ServiceTeamIds.
+    """
+    return normalize_text(query), tuple(sorted({str(team) for team in service_team_ids}))
+
+def _json_object(text):
+    """
+    The first JSON object in an LLM reply, which may wrap it in a code fence or prose. None if there is none.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+class SQLAgentState(AgentState):
+    """
+    Agent state carrying the per-turn values formatted into the system prompt.
+    """
+    service_team_ids: List[Any]
+    sample_queries: Optional[List[str]]
+    schema_digest: str
+
+def sql_agent_prompt(state: SQLAgentState):
+    """
+    Builds the system prompt for the current turn from the agent state. Without a
+    schema digest the prompt documents the join paths and has the agent list the tables.
+    """
+    schema_digest = state.get("schema_digest")
+    prompt = SQL_AGENT_PROMPT if schema_digest else SQL_AGENT_PROMPT_NO_DIGEST
+    system_message = prompt.format(
+        dialect="mssql",
+        top_k=5,
+        ServiceTeamId=state["service_team_ids"],
+        sample_queries=state.get("sample_queries"),
+        schema_digest=schema_digest,
+    )
+    return [SystemMessage(content=system_message), *state["messages"]]
  
 class MyDataSource(DataSource):
     """
@@ -39,10 +100,7 @@ class MyDataSource(DataSource):
         Initializes the LangChain SQL data source.
         """
         self.name = name
-        # SQL Database setup
-        uri = config.DB
-        self.db = SQLDatabase.from_uri(uri, include_tables=['Orders','ApplicationUsers','Children','Pets','Homefindings','HomeFindingProperties','Leases','Properties','Tasks','TaskTypes','AccountPayables','AccountReceivables'])
-        logger.info("SQLDatabase initialized successfully")
+        self.result_cache = query_result_cache if config.SQL_RESULT_CACHE_ENABLED else None
 
         self.llm = AzureChatOpenAI(
                     deployment_name=config.AZURE_OPENAI_MODEL_DEPLOYMENT_NAME,
@@ -51,74 +109,417 @@ class MyDataSource(DataSource):
                     azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
                     model=config.AZURE_OPENAI_TEXT_MODEL_NAME,
                 )
+        self.tools = []
+
+        # Identical questions from the same ServiceTeamIds share one agent run, and its answer for a short while
+        self.answer_flight = SingleFlight()
+        self.answer_cache = TTLCache(maxsize=config.ANSWER_CACHE_MAX_SIZE, ttl=config.ANSWER_REUSE_TTL)
+        self.coalesced = 0
+
+        # Summary of the schema in the agent prompt, so runs start writing SQL without listing tables
+        self.schema_digest = SchemaDigest(max_columns=config.SCHEMA_DIGEST_MAX_COLUMNS)
+
+        # Reflecting the database and compiling the agent are slow, so they are built on first use or during warm-up
+        registry.register("sql_database", self._build_db)
+        registry.register("schema_catalog", self._build_schema_catalog)
+        registry.register("sql_agent", self._build_agent)
+
+    def _build_db(self):
+        # SQL Database setup, pool and replica routing come from configuration
+        engine = create_db_engine(config)
+        db = SQLDatabase(engine, include_tables=['Orders','ApplicationUsers','Children','Pets','Homefindings','HomeFindingProperties','Leases','Properties','Tasks','TaskTypes','AccountPayables','AccountReceivables'])
+        logger.info("SQLDatabase initialized successfully")
+        return db
+
+    def _build_schema_catalog(self):
+        # The whitelisted tables almost never change, so the schema is served from a catalog
+        schema_catalog = SchemaCatalog(
+            self.db, snapshot_path=config.SCHEMA_SNAPSHOT_PATH, hint_values=config.SCHEMA_HINT_VALUES
+        )
+        schema_catalog.load()
+        schema_catalog.ensure_current()
+        if self.result_cache is not None:
+            # cached results may no longer match a changed schema
+            schema_catalog.add_listener(self.result_cache.invalidate)
+        if config.SCHEMA_DIGEST_ENABLED:
+            self.schema_digest.refresh(schema_catalog)
+            schema_catalog.add_listener(lambda: self.schema_digest.refresh(schema_catalog))
+        logger.info("Schema catalog ready")
+        return schema_catalog
+
+    def _build_agent(self):
         # LangChain toolkit and agent setup
-        toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
+        toolkit = SQLDatabaseToolkit(
+            db=self.db, llm=self.llm, catalog=self.schema_catalog, result_cache=self.result_cache
+        )
         self.tools = toolkit.get_tools()
+        # Compiled once and shared across turns; per-turn values travel in the state and run config
+        return create_react_agent(
+            self.llm, self.tools, prompt=sql_agent_prompt, state_schema=SQLAgentState
+        )
+
+    @property
+    def db(self) -> SQLDatabase:
+        return registry.get("sql_database")
+
+    @property
+    def schema_catalog(self) -> SchemaCatalog:
+        return registry.get("schema_catalog")
+
+    @property
+    def agent_executor(self):
+        return registry.get("sql_agent")
  
     def name(self):
         return self.name
  
-    async def render_data(self, context: TurnContext, memory: Memory, tokenizer: Tokenizer, maxTokens: int):
+    async def authorize(self, context: TurnContext):
         """
-        Queries the SQL database using the user-provided input.
+        Resolves the user's email and then their ServiceTeamIds, each bounded by its own timeout.
+        Returns an empty list when either step fails or times out, except that a timed-out
+        ServiceTeamId lookup serves the last good ServiceTeamIds within the stale window.
         """
         #email
-        email = 'Tejkiran@dwellworks.com'
+        try:
+            with span("email_lookup"):
+                email = config.USER_EMAIL_OVERRIDE or await asyncio.wait_for(
+                    aget_user_email(context), timeout=config.EMAIL_LOOKUP_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            logger.warning("User email lookup timed out")
+            return []
         print(f"user email: {email}")
         logger.info(f"Extracted user email: {email}")
+        if not email:
+            return []
         #service team id
-        serviceTeamId = autherized_locations(email)
+        try:
+            with span("locations_lookup"):
+                serviceTeamId = await asyncio.wait_for(
+                    aautherized_locations(email), timeout=config.LOCATIONS_TIMEOUT
+                )
+        except asyncio.TimeoutError:
+            logger.warning("ServiceTeamId lookup timed out")
+            return stale_locations(email)
         print(f"Service Team Id: {serviceTeamId}")  
         logger.info(f"Service Team ID: {serviceTeamId}")
+        return serviceTeamId
+
+    async def render_data(self, context: TurnContext, memory: Memory, tokenizer: Tokenizer, maxTokens: int):
+        """
+        Queries the SQL database using the user-provided input.
+        """
+        with span("render_data"):
+            return await self._render_data(context, memory, tokenizer, maxTokens)
+
+    async def _render_data(self, context: TurnContext, memory: Memory, tokenizer: Tokenizer, maxTokens: int):
+        query = memory.get('temp.input')
+        logger.info(f"User query received: {query}")
+        print(f"User query: {query}")
+        if not query:
+            return Result('', 0, False)
+
+        #retrieve the example queries for the current query, alongside the identity and authorization chain
+        retrieval = asyncio.create_task(
+            asyncio.wait_for(aretrieve_examples(query), timeout=config.RETRIEVAL_TIMEOUT)
+        )
+        serviceTeamId = await self.authorize(context)
         #query
         if serviceTeamId:
-            query = memory.get('temp.input')
-            logger.info(f"User query received: {query}")
-            print(f"User query: {query}")
-            if not query:
-                return Result('', 0, False)
-            
-            #retrieve the example queries for the current query
-            sample_sql_queries = retrieve_docs(query)
-            logger.info(f"Retrieved sample SQL queries: {sample_sql_queries}")
-            print(f"Sample SQL queries: {sample_sql_queries}")
-    
-            system_message = SQL_AGENT_PROMPT.format(dialect="mssql", top_k=5,ServiceTeamId = serviceTeamId, sample_queries = sample_sql_queries)
-            agent_executor = create_react_agent(self.llm, self.tools, state_modifier=system_message)
-            # Execute the query using LangChain agent
+            report = progress_reporter(memory)
+            key = answer_key(query, serviceTeamId)
+            answer = self.answer_cache.get(key)
+            if answer is not None or key in self.answer_flight:
+                # answered by another run, the examples retrieved for this turn are not needed
+                retrieval.cancel()
+                self.coalesced += 1
+                report("Looking up the answer…")
+            try:
+                if answer is None:
+                    answer = await self.answer_flight.do(
+                        key, lambda: self.answer(query, serviceTeamId, retrieval, tokenizer, report, user_key(context))
+                    )
+                response, sql_query = answer
+                if config.CHAT_LOG_ENABLED:
+                    store_chat_in_cosmos(query, sql_query, response, context, serviceTeamId)
+
+                return self.renderDocument(response, tokenizer, maxTokens) if response else Result('', 0, False)
+            except Exception as e:
+                print(f"Error querying the database: {e}")
+                return Result("", 0, False)
+        else:
+            retrieval.cancel()
+            generic_response = "We are unable to fetch your access permissions at the moment. Please try again later."
+            print(f"Returning generic response: {generic_response}")
+            return self.renderDocument(generic_response, tokenizer, maxTokens) if generic_response else Result('', 0, False)
+ 
+    async def answer(self, query, serviceTeamId, retrieval, tokenizer: Tokenizer, report=None, user=None):
+        """
+        Runs the SQL agent for a question and caches the answer for reuse.
+        ``report`` is called with a status text as the agent moves through its tools.
+        A question that closely matches a retrieved example is first tried on the
+        template fast path (see ``fast_answer``), the agent runs when that fails.
+
+        The run is bounded by AGENT_MAX_STEPS LLM calls, AGENT_MAX_TOKENS tokens
+        and AGENT_DEADLINE seconds. A run that hits a budget stops there and
+        answers with the last successful query result, and is not cached.
+        Its usage is added to the counters of ``user`` and ``serviceTeamId``.
+
+        Returns:
+            tuple: The agent's response and the last SQL query it executed.
+        """
+        try:
+            examples = await retrieval
+        except asyncio.TimeoutError:
+            logger.warning("Sample SQL query retrieval timed out")
+            examples = None
+        sample_sql_queries = sample_queries(examples)
+        logger.info(f"Retrieved sample SQL queries: {sample_sql_queries}")
+        print(f"Sample SQL queries: {sample_sql_queries}")
+
+        if config.FAST_PATH_ENABLED and examples:
+            answer = await self.fast_answer(query, examples, serviceTeamId, tokenizer, report, user)
+            if answer is not None:
+                return answer
+
+        # Execute the query using LangChain agent
+        sql_query = None
+        last_result = None
+        last_message = None
+        steps = 0
+        exceeded = None
+        agent_executor = await registry.aget("sql_agent")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + config.AGENT_DEADLINE
+
+        with span("agent") as agent_span, get_openai_callback() as usage:
+            step_span = start_span("agent.step")
+            stream = agent_executor.astream(
+                {
+                    "messages": [{"role": "user", "content": query}],
+                    "service_team_ids": serviceTeamId,
+                    "sample_queries": sample_sql_queries,
+                    "schema_digest": self.schema_digest.text,
+                },
+                config={
+                    "configurable": {"service_team_ids": serviceTeamId, "tokenizer": tokenizer},
+                    "callbacks": [tracing_handler],
+                    # every LLM call is followed by a tool step, so our step budget trips before LangGraph's limit
+                    "recursion_limit": 2 * config.AGENT_MAX_STEPS + 1,
+                },
+                stream_mode="values"
+            )
             try:
-                sql_query = None
+                while True:
+                    try:
+                        step = await asyncio.wait_for(stream.__anext__(), max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError as e:
+                        exceeded = "deadline"
+                        step_span.end(error=e)
+                        break
+                    last_message = step["messages"][-1]
+                    step_span.set("message_type", last_message.type)
+                    step_span.end()
 
-                for step in agent_executor.stream(
-                    {"messages": [{"role": "user", "content": query}]},
-                    stream_mode="values"
-                ):
-                    last_message = step["messages"][-1] 
+                    if last_message.type == "ai":
+                        steps += 1
+                    elif last_message.type == "tool" and last_message.name == "sql_db_query" \
+                            and last_message.content and not last_message.content.startswith("Error"):
+                        last_result = last_message.content
 
                     # Extract SQL query if present in tool calls
                     for tool_call in last_message.additional_kwargs.get("tool_calls", []):
+                        if report is not None and tool_call["function"]["name"] in TOOL_STATUS:
+                            report(TOOL_STATUS[tool_call["function"]["name"]])
                         if tool_call["function"]["name"] == "sql_db_query":
                             sql_query = json.loads(tool_call["function"]["arguments"]).get("query")
 
-                # Get the final response
-                response = last_message.content
-                print(f'Agent response : {response}')
-
-                logger.info(f"SQL Query: {sql_query}")
-                logger.info(f"Agent response: {response}")
-    
-                return Result(self.formatDocument(response), len(response), False) if response else Result('', 0, False)
+                    finished = last_message.type == "ai" and not getattr(last_message, "tool_calls", None)
+                    if finished:
+                        continue
+                    if steps >= config.AGENT_MAX_STEPS:
+                        exceeded = "steps"
+                    elif usage.total_tokens >= config.AGENT_MAX_TOKENS:
+                        exceeded = "tokens"
+                    elif loop.time() >= deadline:
+                        exceeded = "deadline"
+                    if exceeded:
+                        break
+                    step_span = start_span("agent.step")
             except Exception as e:
-                print(f"Error querying the database: {e}")
-                return Result("", 0, False)
+                step_span.end(error=e)
+                raise
+            finally:
+                await stream.aclose()
+            agent_span.set("steps", steps)
+            agent_span.set("schema_digest_tokens", self.schema_digest.tokens)
+            agent_span.set("prompt_tokens", usage.prompt_tokens)
+            agent_span.set("completion_tokens", usage.completion_tokens)
+            agent_span.set("total_cost", usage.total_cost)
+            if exceeded:
+                agent_span.set("budget_exceeded", exceeded)
+                budget_exceeded.inc(exceeded)
+
+        usage_counters.record(
+            user,
+            serviceTeamId,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_cost=usage.total_cost,
+            agent_seconds=loop.time() - started,
+            budget_exceeded=exceeded is not None,
+        )
+
+        # Get the final response
+        if exceeded:
+            logger.warning(f"Agent run stopped by the {exceeded} budget after {steps} steps and {usage.total_tokens} tokens")
+            response = self.partial_answer(last_result)
         else:
-            generic_response = "We are unable to fetch your access permissions at the moment. Please try again later."
-            print(f"Returning generic response: {generic_response}")
-            return Result(self.formatDocument(generic_response), len(generic_response), False) if generic_response else Result('', 0, False)
- 
+            response = last_message.content if last_message is not None else ""
+        print(f'Agent response : {response}')
+
+        logger.info(f"SQL Query: {sql_query}")
+        logger.info(f"Agent response: {response}")
+        if response and not exceeded and config.ANSWER_REUSE_TTL > 0:
+            self.answer_cache.set(answer_key(query, serviceTeamId), (response, sql_query))
+        return response, sql_query
+
+    async def fast_answer(self, query, examples, serviceTeamId, tokenizer: Tokenizer, report=None, user=None):
+        """
+        Answers with the stored query of the closest example, without the agent,
+        when its similarity to the question is at least FAST_PATH_MIN_SIMILARITY.
+        The query's literal values are re-bound to the question (by one LLM call,
+        none when it has no values besides the ServiceTeamIds), the bound query
+        must pass the local validator, and it runs like an agent's sql_db_query.
+
+        Returns:
+            tuple: The response and the SQL query, or None to fall back to the agent.
+        """
+        scored = [example for example in examples if example.get("similarity") is not None]
+        if not scored:
+            return None
+        example = max(scored, key=lambda e: e["similarity"])
+        if example["similarity"] < config.FAST_PATH_MIN_SIMILARITY:
+            return None
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        sql_query = None
+        result = None
+        with span("fast_path", similarity=example["similarity"]) as fast_span, get_openai_callback() as usage:
+            try:
+                sql_query, outcome = await asyncio.wait_for(
+                    self._bind_example(query, example, serviceTeamId), config.FAST_PATH_TIMEOUT
+                )
+                if sql_query is not None:
+                    if report is not None:
+                        report(TOOL_STATUS["sql_db_query"])
+                    query_tool = next(tool for tool in self.tools if tool.name == "sql_db_query")
+                    count_tokens = (lambda text: len(tokenizer.encode(text))) if tokenizer is not None else None
+                    result = await asyncio.wait_for(
+                        run_in_db_executor(query_tool._execute, sql_query, serviceTeamId, count_tokens),
+                        max(started + config.FAST_PATH_TIMEOUT - loop.time(), 0),
+                    )
+                    outcome = "error" if str(result).startswith("Error") else "answered"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except Exception as e:
+                logger.warning(f"Template fast path failed: {e}")
+                outcome = "failed"
+            fast_span.set("outcome", outcome)
+            fast_span.set("prompt_tokens", usage.prompt_tokens)
+            fast_span.set("completion_tokens", usage.completion_tokens)
+            fast_path.inc(outcome)
+
+        if usage.total_tokens or outcome == "answered":
+            usage_counters.record(
+                user,
+                serviceTeamId,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                total_cost=usage.total_cost,
+                agent_seconds=loop.time() - started,
+            )
+        if outcome != "answered":
+            logger.info(f"Template fast path fell back to the agent: {outcome}")
+            return None
+
+        response = f"Result of the query `{sql_query}`: {result}"
+        logger.info(f"SQL Query: {sql_query}")
+        logger.debug(f"Fast path answered with {len(str(result))} characters of results")
+        if config.ANSWER_REUSE_TTL > 0:
+            self.answer_cache.set(answer_key(query, serviceTeamId), (response, sql_query))
+        return response, sql_query
+
+    async def _bind_example(self, query, example, serviceTeamId):
+        """
+        Binds the example's stored query to the question and validates it.
+
+        Returns:
+            tuple: The SQL query, or None, and the fast path outcome.
+        """
+        # the query runs through the agent's sql_db_query tool, built with the agent
+        await registry.aget("sql_agent")
+        db = self.db
+        template = parameterize(example["sqlQuery"], db.dialect)
+        if template is None:
+            return None, "unparsed"
+        if len(template.slots) > config.FAST_PATH_MAX_PARAMETERS:
+            return None, "too_many_parameters"
+
+        values = {}
+        if template.slots:
+            prompt = TEMPLATE_BINDING_PROMPT.format(
+                dialect=db.dialect,
+                example_question=example["content"],
+                template=template.text(),
+                parameters=json.dumps(slot_descriptions(template)),
+                question=query,
+            )
+            message = await self.llm.ainvoke(prompt, config={"callbacks": [tracing_handler]})
+            binding = _json_object(message.content)
+            if binding is None:
+                return None, "unparsed_binding"
+            if not binding.get("applies"):
+                return None, "not_applicable"
+            values = binding.get("values") or {}
+
+        try:
+            sql_query = bind(template, values, serviceTeamId)
+        except ValueError:
+            return None, "invalid_values"
+        result = validate_query(sql_query, serviceTeamId, db.dialect, self.schema_catalog.join_paths())
+        if result.status != OK:
+            return None, "rejected"
+        return sql_query, "bound"
+
+    def partial_answer(self, last_result):
+        """
+        Best answer available when the agent run was stopped by a budget: the last successful query result, if any.
+        """
+        if last_result:
+            return f"The answer could not be completed in time. The most recent query returned: {last_result}"
+        return "The question took too long to answer. Please ask a more specific question."
+
     def formatDocument(self, result):
         """
         Formats the result string.
         """
         return f"<context>{result}</context>"
+
+    def renderDocument(self, result, tokenizer: Tokenizer, maxTokens: int):
+        """
+        Formats the result and trims it to the token budget of the prompt section.
+        """
+        document = self.formatDocument(result)
+        tokens = tokenizer.encode(document)
+        if len(tokens) <= maxTokens:
+            return Result(document, len(tokens), False)
+        # trimmed to fit, so the section is not reported as too long; keep the closing tag
+        budget = max(maxTokens - len(tokenizer.encode(self.formatDocument(""))), 0)
+        trimmed = self.formatDocument(tokenizer.decode(tokenizer.encode(result)[:budget]))
+        return Result(trimmed, len(tokenizer.encode(trimmed)), False)
     
\ No newline at end of file
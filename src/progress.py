@@ -0,0 +1,54 @@
+from botbuilder.core import TurnContext
+from teams.ai.planners import Planner
+from teams.state import TurnState
+
+# Status shown to the user while the agent calls each tool
+TOOL_STATUS = {
+    "sql_db_list_tables": "Looking up tables…",
+    "sql_db_schema": "Looking up schema…",
+    "sql_db_query_checker": "Checking query…",
+    "sql_db_query": "Running query…",
+}
+
+def is_personal(context: TurnContext):
+    conversation = context.activity.conversation
+    return conversation is not None and conversation.conversation_type == "personal"
+
+class PersonalStreamingPlanner(Planner[TurnState]):
+    """
+    Uses the streaming planner in personal chats, the only conversations where
+    Teams accepts streamed messages, and the regular planner everywhere else.
+    """
+
+    def __init__(self, streaming_planner: Planner, planner: Planner):
+        self.streaming_planner = streaming_planner
+        self.planner = planner
+
+    def _select(self, context: TurnContext):
+        return self.streaming_planner if is_personal(context) else self.planner
+
+    async def begin_task(self, context: TurnContext, state: TurnState):
+        return await self._select(context).begin_task(context, state)
+
+    async def continue_task(self, context: TurnContext, state: TurnState):
+        return await self._select(context).continue_task(context, state)
+
+def progress_reporter(memory):
+    """
+    Returns a callable that sends a status text as an informative update on the
+    turn's streaming response, or does nothing when the turn is not streamed.
+    """
+    streamer = memory.get("temp.streamer")
+    last = [None]
+
+    def report(text):
+        # the same status twice in a row adds nothing, skip it to stay under the channel's update rate
+        if streamer is None or text == last[0]:
+            return
+        last[0] = text
+        try:
+            streamer.queue_informative_update(text)
+        except Exception as e:
+            print(f"Failed to send progress update: {e}")
+
+    return report
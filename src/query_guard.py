@@ -0,0 +1,137 @@
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.tracing import span, sql_guard
+
+SHOWPLAN_NS = {"p": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+
+@dataclass
+class PlanEstimate:
+    cost: float  # estimated subtree cost of the statements, in SQL Server cost units
+    rows: float  # estimated rows returned
+    operator_rows: float  # largest estimated row count flowing out of any operator, over all its executions
+    operator: str  # that operator, e.g. "Table Scan of [Tasks]"
+    cartesian: bool  # a join without a join predicate
+
+def _float(element, name):
+    try:
+        return float(element.get(name) or 0)
+    except ValueError:
+        return 0.0
+
+def _describe(relop):
+    # scans and seeks name their table in their own element, nested operators belong to other RelOps
+    target = relop.find("./*/p:Object", SHOWPLAN_NS)
+    name = relop.get("PhysicalOp", "operator")
+    return f"{name} of {target.get('Table')}" if target is not None and target.get("Table") else name
+
+def parse_showplan(xml_text):
+    """
+    Summarizes a SQL Server estimated execution plan (SET SHOWPLAN_XML output).
+
+    Args:
+        xml_text (str): The showplan XML.
+
+    Returns:
+        PlanEstimate: Statement cost and rows, the operator producing the most rows and whether a join has no predicate.
+    """
+    root = ET.fromstring(xml_text)
+    statements = root.findall(".//p:StmtSimple", SHOWPLAN_NS)
+    estimate = PlanEstimate(
+        cost=sum(_float(s, "StatementSubTreeCost") for s in statements),
+        rows=max((_float(s, "StatementEstRows") for s in statements), default=0.0),
+        operator_rows=0.0,
+        operator="",
+        cartesian=False,
+    )
+    for relop in root.iter(f"{{{SHOWPLAN_NS['p']}}}RelOp"):
+        executions = 1 + _float(relop, "EstimateRebinds") + _float(relop, "EstimateRewinds")
+        rows = _float(relop, "EstimateRows") * executions
+        if rows > estimate.operator_rows:
+            estimate.operator_rows, estimate.operator = rows, _describe(relop)
+        warnings = relop.find("p:Warnings", SHOWPLAN_NS)
+        if warnings is not None and (
+            warnings.get("NoJoinPredicate") in ("true", "1") or warnings.find("p:NoJoinPredicate", SHOWPLAN_NS) is not None
+        ):
+            estimate.cartesian = True
+    return estimate
+
+def estimate_plan(db, query) -> Optional[PlanEstimate]:
+    """
+    Fetches the estimated plan of a query without running it.
+
+    Only SQL Server is supported; other dialects, and queries SQL Server cannot
+    compile (their execution reports the error), return None.
+    """
+    if db.dialect != "mssql":
+        return None
+    with db._engine.connect() as connection:
+        connection.exec_driver_sql("SET SHOWPLAN_XML ON")
+        try:
+            rows = connection.exec_driver_sql(query).fetchall()
+        except SQLAlchemyError:
+            return None
+        finally:
+            try:
+                connection.exec_driver_sql("SET SHOWPLAN_XML OFF")
+            except SQLAlchemyError:
+                # never hand a connection that only returns plans back to the pool
+                connection.invalidate()
+    if not rows or not rows[0][0]:
+        return None
+    return parse_showplan(rows[0][0])
+
+def check_cost(db, query, max_cost, max_rows):
+    """
+    Rejects a query whose estimated plan exceeds the cost or row limits, or joins tables without a predicate.
+
+    Args:
+        db (SQLDatabase): The database the query will run on.
+        query (str): The SQL query.
+        max_cost (float): Highest estimated statement cost allowed, 0 for no limit.
+        max_rows (float): Highest estimated row count of any plan operator allowed, 0 for no limit.
+
+    Returns:
+        str: An error message for the agent, or None when the query may run.
+    """
+    with span("sql.plan") as current:
+        try:
+            estimate = estimate_plan(db, query)
+        except SQLAlchemyError as e:
+            # e.g. no SHOWPLAN permission: run unguarded, the statement timeout still applies
+            current.set("error", type(e).__name__)
+            return None
+        if estimate is None:
+            return None
+        current.set("cost", estimate.cost)
+        current.set("rows", estimate.rows)
+        current.set("operator_rows", estimate.operator_rows)
+
+        if estimate.cartesian:
+            reason = "cartesian"
+            message = (
+                "The query joins tables without a join condition, which multiplies their rows. "
+                "Join every table through its key columns (see the schema) and try again."
+            )
+        elif max_cost and estimate.cost > max_cost:
+            reason = "cost"
+            message = (
+                f"The query is too expensive to run (estimated cost {estimate.cost:.1f}, limit {max_cost:g}; "
+                f"{estimate.operator} produces about {estimate.operator_rows:,.0f} rows). "
+                "Filter on key columns, aggregate instead of returning detail rows, or use TOP."
+            )
+        elif max_rows and estimate.operator_rows > max_rows:
+            reason = "rows"
+            message = (
+                f"The query would process too many rows ({estimate.operator} produces about "
+                f"{estimate.operator_rows:,.0f} rows, limit {max_rows:,.0f}). "
+                "Add filters or join through fewer tables."
+            )
+        else:
+            return None
+        current.set("rejected", reason)
+        sql_guard.inc(reason)
+        return f"Error: {message}"
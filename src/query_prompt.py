@@ -21,4 +21,25 @@ Tables must be joined based on actual relationships (PK ↔ FK).
 Always make sure the filtering condition 'ServiceTeamId in...' is present in the final query
 Output the final SQL query only.
  
-SQL Query: """
\ No newline at end of file
+SQL Query: """
+TEMPLATE_BINDING_PROMPT = """
+A vetted {dialect} query answers the example question below. Its literal values were replaced by parameters.
+Decide whether the same query, with different parameter values, answers the new question, and extract those values from the new question.
+
+Example question: {example_question}
+Query template: {template}
+Parameters (name, compared column, value for the example question): {parameters}
+
+New question: {question}
+
+Rules:
+- The query applies only if the new question asks for the same thing as the example question, with the same filters, grouping and ordering. Only the parameter values may differ.
+- Take values from the new question only. Do not make assumptions or infer values that are not explicitly provided.
+- NEVER alter user-provided names or personal values (e.g., FirstName, LastName). **Preserve exact spelling**, even if it appears incorrect.
+- Handle possessive names correctly. Assume that possessive names like "Steve Roger's" refer to someone whose last name is "Roger".
+- Write dates as YYYY-MM-DD.
+- Give a value for every parameter; keep the example's value when the new question uses the same one.
+
+Answer with JSON only, no other text:
+{{"applies": true or false, "values": {{"<parameter name>": "<value>"}}}}
+"""
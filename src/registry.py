@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+class ClientRegistry:
+    """
+    Builds heavyweight clients (database, search, auth, storage) on first use.
+
+    Modules register a zero-argument factory under a name; the first ``get``
+    builds the client and later calls return the same instance. ``warm_up``
+    builds clients in parallel worker threads so they are ready before the
+    first request needs them, and the build time of each one is recorded.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.timings = {}  # name -> seconds spent building
+        self.errors = {}  # name -> last build error
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_built(self, name):
+        return name in self._instances
+
+    def get(self, name):
+        """
+        Returns the client registered under ``name``, building it on first use.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    raise
+                self.timings[name] = time.perf_counter() - started
+                self.errors.pop(name, None)
+                self._instances[name] = instance
+        return instance
+
+    async def aget(self, name):
+        """
+        Async version of get, builds the client in a worker thread so the event loop keeps running.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get, name)
+
+    def discard(self, name):
+        """
+        Forgets the built instance so the next ``get`` builds a new one.
+        """
+        with self._locks[name]:
+            self._instances.pop(name, None)
+
+    async def warm_up(self, names=None):
+        """
+        Builds the given clients (all registered ones by default) in parallel.
+
+        Returns:
+            dict: Name -> True when the client is ready, or the error that prevented it.
+        """
+        names = list(names or self._factories)
+        results = await asyncio.gather(*(self.aget(name) for name in names), return_exceptions=True)
+        return {
+            name: result if isinstance(result, Exception) else True
+            for name, result in zip(names, results)
+        }
+
+registry = ClientRegistry()
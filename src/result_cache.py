@@ -0,0 +1,71 @@
+import json
+
+from src.cache import TTLCache
+from src.config import Config
+from src.sql_validator import canonicalize, referenced_tables
+
+config = Config()
+
+# Lookup tables change far less often than transactional ones
+DEFAULT_TABLE_TTLS = {
+    "tasktypes": 86400,
+}
+
+class QueryResultCache:
+    """
+    Caches sql_db_query results keyed on the canonicalized SQL text plus the caller's ServiceTeamIds.
+
+    Each entry lives for the shortest TTL of the tables it reads, the cache is
+    bounded by entry count and total result bytes (LRU eviction), and entries
+    can be invalidated per table or all at once.
+    """
+
+    def __init__(self, default_ttl=300, table_ttls=None, max_entries=10000, max_bytes=32 * 1024 * 1024):
+        self.default_ttl = default_ttl
+        self.table_ttls = {table.lower(): ttl for table, ttl in (table_ttls or {}).items()}
+        self.cache = TTLCache(maxsize=max_entries, ttl=default_ttl, max_bytes=max_bytes)
+
+    def _key(self, query, service_team_ids, dialect):
+        return canonicalize(query, dialect), tuple(sorted(str(i).lower() for i in service_team_ids))
+
+    def ttl_for(self, tables):
+        return min((self.table_ttls.get(table, self.default_ttl) for table in tables), default=self.default_ttl)
+
+    def get(self, query, service_team_ids, dialect="mssql"):
+        entry = self.cache.get(self._key(query, service_team_ids, dialect))
+        return None if entry is None else entry[0]
+
+    def set(self, query, service_team_ids, result, dialect="mssql"):
+        tables = referenced_tables(query, dialect)
+        if tables is None:
+            return
+        self.cache.set(
+            self._key(query, service_team_ids, dialect),
+            (result, frozenset(tables)),
+            ttl=self.ttl_for(tables),
+            size=len(str(result).encode("utf-8")),
+        )
+
+    def invalidate(self, tables=None):
+        """
+        Drops cached results that read any of ``tables``, or everything when ``tables`` is None.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        if tables is None:
+            removed = len(self.cache)
+            self.cache.clear()
+            return removed
+        tables = {table.lower() for table in tables}
+        return self.cache.pop_where(lambda entry: not tables.isdisjoint(entry[1]))
+
+    def stats(self):
+        return self.cache.stats()
+
+query_result_cache = QueryResultCache(
+    default_ttl=config.SQL_RESULT_CACHE_TTL,
+    table_ttls={**DEFAULT_TABLE_TTLS, **json.loads(config.SQL_RESULT_CACHE_TABLE_TTLS or "{}")},
+    max_entries=config.SQL_RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=config.SQL_RESULT_CACHE_MAX_BYTES,
+)
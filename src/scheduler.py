@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import deque
+
+from botbuilder.core import Bot, TurnContext
+
+from src.usage import user_key
+
+BUSY_MESSAGE = "I'm handling a lot of questions right now. Please try again in a minute."
+
+class SchedulerBusy(Exception):
+    """
+    Raised when a turn is shed because the queue is full or its deadline passed.
+    """
+
+class TurnScheduler:
+    """
+    Admission control for agent turns.
+
+    At most ``max_concurrent`` turns run at once, and at most ``max_per_user``
+    for any one user. Turns beyond that wait in a queue of ``max_queue`` slots
+    for up to ``queue_timeout`` seconds; when the queue is full or the wait
+    runs out the turn is shed with SchedulerBusy.
+    """
+
+    def __init__(self, max_concurrent=16, max_per_user=2, max_queue=64, queue_timeout=10.0, window=1000):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._user_slots = {}  # user key -> [semaphore, holders and waiters]
+        self.queued = 0
+        self.in_flight = 0
+        self.max_queued = 0
+        self.admitted = 0
+        self.completed = 0
+        self.shed_full = 0
+        self.shed_timeout = 0
+        self._wait_times = deque(maxlen=window)
+
+    def _user_slot(self, user_key):
+        slot = self._user_slots.get(user_key)
+        if slot is None:
+            slot = self._user_slots[user_key] = [asyncio.Semaphore(self.max_per_user), 0]
+        slot[1] += 1
+        return slot[0]
+
+    def _release_user_slot(self, user_key):
+        slot = self._user_slots[user_key]
+        slot[1] -= 1
+        if slot[1] == 0:
+            del self._user_slots[user_key]
+
+    async def _acquire(self, user_semaphore, deadline):
+        await asyncio.wait_for(user_semaphore.acquire(), max(deadline - time.monotonic(), 0))
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline - time.monotonic(), 0))
+        except BaseException:
+            user_semaphore.release()
+            raise
+
+    async def run(self, user_key, func):
+        """
+        Runs ``func()`` once a slot is free for the user and globally.
+
+        Args:
+            user_key (str): Identifies the user the turn belongs to.
+            func (callable): Zero-argument coroutine function running the turn.
+
+        Returns:
+            Any: The result of ``func()``.
+
+        Raises:
+            SchedulerBusy: When the turn was shed instead of run.
+        """
+        started = time.monotonic()
+        user_semaphore = self._user_slot(user_key)
+        if user_semaphore.locked() or self._slots.locked():
+            if self.queued >= self.max_queue:
+                self._release_user_slot(user_key)
+                self.shed_full += 1
+                raise SchedulerBusy("queue full")
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await self._acquire(user_semaphore, started + self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._release_user_slot(user_key)
+                self.shed_timeout += 1
+                raise SchedulerBusy("queue deadline passed")
+            except BaseException:
+                self._release_user_slot(user_key)
+                raise
+            finally:
+                self.queued -= 1
+        else:
+            # both slots are free, acquiring them does not wait
+            await user_semaphore.acquire()
+            await self._slots.acquire()
+
+        self._wait_times.append(time.monotonic() - started)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            return await func()
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+            user_semaphore.release()
+            self._release_user_slot(user_key)
+
+    def stats(self):
+        """
+        Returns queue depth, in-flight and shed counters and queue wait percentiles in seconds.
+        """
+        waits = sorted(self._wait_times)
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p), len(waits) - 1)] if waits else 0.0
+
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "shed_full": self.shed_full,
+            "shed_timeout": self.shed_timeout,
+            "wait_p50": percentile(0.50),
+            "wait_p95": percentile(0.95),
+            "wait_p99": percentile(0.99),
+        }
+
+class ScheduledBot(Bot):
+    """
+    Runs message turns of the wrapped bot through a TurnScheduler and answers
+    shed turns with a short busy reply. Other activities are not scheduled.
+    """
+
+    def __init__(self, bot: Bot, scheduler: TurnScheduler):
+        self.bot = bot
+        self.scheduler = scheduler
+
+    async def on_turn(self, context: TurnContext):
+        if context.activity.type != "message":
+            return await self.bot.on_turn(context)
+        try:
+            await self.scheduler.run(user_key(context) or "anonymous", lambda: self.bot.on_turn(context))
+        except SchedulerBusy:
+            await context.send_activity(BUSY_MESSAGE)
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import bindparam, column as column_clause, inspect, select, table as table_clause, text
+from sqlalchemy.exc import SQLAlchemyError
+from langchain_community.utilities.sql_database import SQLDatabase
+
+COLUMNS_QUERY = text(
+    "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE FROM INFORMATION_SCHEMA.COLUMNS "
+    "WHERE TABLE_NAME IN :table_names ORDER BY TABLE_NAME, ORDINAL_POSITION"
+).bindparams(bindparam("table_names", expanding=True))
+
+# Status-like columns and the names in lookup tables, whose few distinct values are worth listing
+HINT_COLUMN = re.compile(r"(status|type|state|category|kind)(id)?$", re.IGNORECASE)
+LOOKUP_TABLE = re.compile(r"(types|statuses|categories)$", re.IGNORECASE)
+
+# The sample rows block SQLDatabase.get_table_info appends to each table's DDL
+SAMPLE_ROWS = re.compile(r"\n*/\*\n\d+ rows from .*?\*/", re.DOTALL)
+
+class SchemaCatalog:
+    """
+    Schema information for the whitelisted tables, built once and served from memory.
+
+    Holds per-table DDL with sample rows (the same text SQLDatabase.get_table_info
+    produces), column lists, foreign-key relationships and the values of
+    status-like columns with few distinct values. A fingerprint of the column
+    definitions detects schema changes so the catalog can be rebuilt.
+    """
+
+    def __init__(self, db: SQLDatabase, snapshot_path: str = "", hint_values: int = 0):
+        self.db = db
+        self.snapshot_path = snapshot_path
+        self.hint_values = hint_values
+        self.tables = {}  # name -> {"ddl": str, "columns": [...], "foreign_keys": [...], "value_hints": {...}}
+        self.fingerprint = None
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        self._listeners = []
+
+    def compute_fingerprint(self):
+        """
+        Hashes the column definitions of the whitelisted tables with a single metadata query.
+        """
+        table_names = sorted(self.db.get_usable_table_names())
+        try:
+            with self.db._engine.connect() as connection:
+                rows = [tuple(row) for row in connection.execute(COLUMNS_QUERY, {"table_names": table_names})]
+        except SQLAlchemyError:
+            # databases without INFORMATION_SCHEMA (e.g. SQLite) fall back to reflection
+            inspector = inspect(self.db._engine)
+            rows = [
+                (table, column["name"], str(column["type"]), column.get("nullable"))
+                for table in table_names
+                for column in inspector.get_columns(table)
+            ]
+        return hashlib.sha256(repr(rows).encode("utf-8")).hexdigest()
+
+    def _value_hints(self, table, columns, foreign_keys):
+        """
+        Distinct values of the table's status-like columns, for those with at most ``hint_values`` of them.
+        Foreign-key columns are skipped, the referenced lookup table holds their meaning.
+        """
+        referencing = {name for fk in foreign_keys for name in fk["columns"]}
+        candidates = [
+            c["name"] for c in columns
+            if c["name"] not in referencing
+            and (HINT_COLUMN.search(c["name"]) or (LOOKUP_TABLE.search(table) and c["name"].lower() == "name"))
+        ]
+        hints = {}
+        if self.hint_values <= 0 or not candidates:
+            return hints
+        with self.db._engine.connect() as connection:
+            for name in candidates:
+                query = (
+                    select(column_clause(name))
+                    .distinct()
+                    .select_from(table_clause(table))
+                    .where(column_clause(name).isnot(None))
+                    .limit(self.hint_values + 1)
+                )
+                try:
+                    values = [row[0] for row in connection.execute(query)]
+                except SQLAlchemyError as e:
+                    print(f"Failed to read values of {table}.{name}: {e}")
+                    continue
+                if len(values) <= self.hint_values:
+                    hints[name] = sorted(str(value) for value in values)
+        return hints
+
+    def build(self, fingerprint=None):
+        """
+        Reflects every whitelisted table and caches its DDL, sample rows, relationships and value hints.
+        """
+        inspector = inspect(self.db._engine)
+        tables = {}
+        for table in sorted(self.db.get_usable_table_names()):
+            columns = inspector.get_columns(table)
+            foreign_keys = [
+                {
+                    "columns": fk["constrained_columns"],
+                    "referred_table": fk["referred_table"],
+                    "referred_columns": fk["referred_columns"],
+                }
+                for fk in inspector.get_foreign_keys(table)
+            ]
+            tables[table] = {
+                "ddl": self.db.get_table_info([table]),
+                "columns": [column["name"] for column in columns],
+                "primary_key": inspector.get_pk_constraint(table).get("constrained_columns", []),
+                "foreign_keys": foreign_keys,
+                "value_hints": self._value_hints(table, columns, foreign_keys),
+            }
+        with self._lock:
+            self.tables = tables
+            self.fingerprint = fingerprint or self.compute_fingerprint()
+            self.built_at = time.time()
+
+    def save(self, path=None):
+        """
+        Writes the catalog to disk without the sample rows: they are read across all
+        ServiceTeamIds and must not outlive the process. A catalog loaded from the
+        snapshot serves bare DDL until it is rebuilt.
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            tables = {
+                table: {**info, "ddl": SAMPLE_ROWS.sub("", info["ddl"])} for table, info in self.tables.items()
+            }
+            json.dump({"fingerprint": self.fingerprint, "built_at": self.built_at, "tables": tables}, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """
+        Loads a serialized catalog. Returns False when there is no usable snapshot.
+        """
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load schema snapshot: {e}")
+            return False
+        if set(snapshot.get("tables", {})) != set(self.db.get_usable_table_names()):
+            return False
+        with self._lock:
+            self.tables = snapshot["tables"]
+            self.fingerprint = snapshot.get("fingerprint")
+            self.built_at = snapshot.get("built_at", 0.0)
+        return True
+
+    def add_listener(self, callback):
+        """
+        Registers a zero-argument callback run after the catalog is rebuilt for a schema change.
+        """
+        self._listeners.append(callback)
+
+    def ensure_current(self):
+        """
+        Rebuilds the catalog when the live schema fingerprint differs from the cached one.
+
+        Returns:
+            bool: True when the catalog was rebuilt.
+        """
+        fingerprint = self.compute_fingerprint()
+        if self.tables and fingerprint == self.fingerprint:
+            return False
+        self.build(fingerprint)
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Failed to save schema snapshot: {e}")
+        for callback in self._listeners:
+            callback()
+        return True
+
+    def start_watch(self, interval):
+        """
+        Starts a daemon thread that checks the schema fingerprint every ``interval`` seconds.
+        """
+        if self._watch_thread is not None or interval <= 0:
+            return
+
+        def _watch_loop():
+            while not self._watch_stop.wait(interval):
+                try:
+                    if self.ensure_current():
+                        print("Schema change detected, schema catalog rebuilt.")
+                except SQLAlchemyError as e:
+                    print(f"Schema fingerprint check failed: {e}")
+
+        self._watch_thread = threading.Thread(target=_watch_loop, name="schema-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self):
+        self._watch_stop.set()
+
+    def get_usable_table_names(self):
+        return sorted(self.tables)
+
+    def get_table_info_no_throw(self, table_names=None):
+        """
+        Same output as SQLDatabase.get_table_info_no_throw, served without touching the database.
+        """
+        tables = self.tables
+        table_names = table_names if table_names is not None else sorted(tables)
+        missing_tables = set(table_names).difference(tables)
+        if missing_tables:
+            return f"Error: table_names {missing_tables} not found in database"
+        return "\n\n".join(tables[table]["ddl"] for table in table_names)
+
+    def foreign_keys(self):
+        """
+        Returns every foreign key as (table, columns, referred_table, referred_columns).
+        """
+        return [
+            (table, tuple(fk["columns"]), fk["referred_table"], tuple(fk["referred_columns"]))
+            for table, info in self.tables.items()
+            for fk in info["foreign_keys"]
+        ]
+
+    def join_paths(self):
+        """
+        Returns every foreign key column pair as (table, column, referred_table, referred_column),
+        the join paths the query validator accepts.
+        """
+        return [
+            (table, column, referred_table, referred_column)
+            for table, columns, referred_table, referred_columns in self.foreign_keys()
+            for column, referred_column in zip(columns, referred_columns)
+        ]
@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from teams.ai.tokenizers import GPTTokenizer
+
+from src.sql_validator import KNOWN_JOINS
+
+logger = logging.getLogger(__name__)
+
+ROOT_TABLE = "Orders"
+
+def _join_graph(catalog, extra_joins):
+    """
+    Join paths between catalog tables, from its foreign keys and ``extra_joins``, keyed by table in both
+    directions. Each entry is (column, other table, other column, True on the referencing side).
+    """
+    names = {table.lower(): table for table in catalog.tables}
+    graph = {table: [] for table in catalog.tables}
+    seen = set()
+    for table, column, other_table, other_column in list(catalog.join_paths()) + list(extra_joins):
+        left, right = names.get(table.lower()), names.get(other_table.lower())
+        if left is None or right is None:
+            continue
+        key = frozenset([(left, column.lower()), (right, other_column.lower())])
+        if key in seen:
+            continue
+        seen.add(key)
+        graph[left].append((column, right, other_column, True))
+        graph[right].append((other_column, left, column, False))
+    return graph
+
+def _paths_to(graph, root):
+    """
+    Shortest join path from every table to ``root``, as a list of (table, column, table, column) hops.
+    """
+    paths = {root: []}
+    queue = deque([root])
+    while queue:
+        table = queue.popleft()
+        for column, other, other_column, _ in graph.get(table, []):
+            if other not in paths:
+                paths[other] = [(other, other_column, table, column)] + paths[table]
+                queue.append(other)
+    return paths
+
+def _column_entry(name, primary_key, references, hints):
+    entry = name
+    if name in primary_key:
+        entry += " PK"
+    if name in references:
+        entry += "→" + references[name]
+    if name in hints:
+        entry += "{" + "|".join(hints[name]) + "}"
+    return entry
+
+def render_digest(catalog, extra_joins=KNOWN_JOINS, root=ROOT_TABLE, max_columns=40):
+    """
+    Renders a compact, token-minimized summary of the catalog's tables for the agent prompt.
+
+    One line per table lists its columns, marking the primary key (PK), foreign
+    keys (→Table.Column) and the values of status-like columns ({a|b}); key and
+    hinted columns come first and at most ``max_columns`` are listed. A second
+    section gives the shortest join path from every table to ``root``.
+
+    Args:
+        catalog (SchemaCatalog): A built catalog.
+        extra_joins (list): Join paths not declared as foreign keys, as (table, column, table, column).
+        root (str): The table every query is filtered through.
+        max_columns (int): Columns listed per table.
+
+    Returns:
+        str: The digest.
+    """
+    tables = catalog.tables
+    root = next((table for table in tables if table.lower() == root.lower()), root)
+    graph = _join_graph(catalog, extra_joins)
+
+    lines = ["Tables (PK primary key, →Table.Column join, {a|b} all values):"]
+    for table in sorted(tables):
+        info = tables[table]
+        primary_key = set(info.get("primary_key") or [])
+        hints = info.get("value_hints") or {}
+        references = {}
+        for column, other, other_column, referencing in graph[table]:
+            if referencing:
+                references.setdefault(column, f"{other}.{other_column}")
+        columns = info["columns"]
+        keyed = [c for c in columns if c in primary_key or c in references or c in hints or c.lower() == "serviceteamid"]
+        ordered = keyed + [c for c in columns if c not in keyed]
+        entries = [_column_entry(c, primary_key, references, hints) for c in ordered[:max_columns]]
+        if len(ordered) > max_columns:
+            entries.append(f"+{len(ordered) - max_columns} more")
+        lines.append(f"{table}: {', '.join(entries)}")
+
+    paths = _paths_to(graph, root)
+    lines.append(f"Joins to {root} (filter ServiceTeamId there):")
+    for table in sorted(tables):
+        if table == root:
+            continue
+        if table not in paths:
+            lines.append(f"{table}: no known join")
+            continue
+        hops = " → ".join(f"{t}.{c}={o}.{oc}" for t, c, o, oc in paths[table])
+        lines.append(f"{table}: {hops}")
+    return "\n".join(lines)
+
+class SchemaDigest:
+    """
+    The schema digest embedded in the agent prompt, regenerated whenever the
+    catalog's fingerprint changes. Its size in tokens is kept for reporting.
+    ``text`` stays empty until a digest is built; the agent then gets the prompt
+    that has it explore the schema with its tools.
+    """
+
+    def __init__(self, max_columns=40):
+        self.max_columns = max_columns
+        self.text = ""
+        self.tokens = 0
+        self.fingerprint = None
+        self.built_at = 0.0
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _count_tokens(self, text):
+        """
+        Token count for reporting; a character estimate when the tokenizer is unavailable
+        (it downloads its encoding on first use), so reporting never blocks the digest.
+        """
+        try:
+            if self._tokenizer is None:
+                self._tokenizer = GPTTokenizer()
+            return len(self._tokenizer.encode(text))
+        except Exception as e:
+            logger.warning(f"Schema digest tokens estimated from characters: {e}")
+            return len(text) // 4
+
+    def refresh(self, catalog):
+        """
+        Regenerates the digest from ``catalog`` unless it was built for the same fingerprint.
+
+        Returns:
+            bool: True when the digest was regenerated.
+        """
+        with self._lock:
+            if catalog.fingerprint is not None and catalog.fingerprint == self.fingerprint:
+                return False
+            text = render_digest(catalog, max_columns=self.max_columns)
+            tokens = self._count_tokens(text)
+            self.text, self.tokens = text, tokens
+            self.fingerprint = catalog.fingerprint
+            self.built_at = time.time()
+        logger.info(
+            f"Schema digest built for fingerprint {catalog.fingerprint}: {len(catalog.tables)} tables, {self.tokens} tokens"
+        )
+        return True
+
+    def stats(self):
+        return {
+            "tokens": self.tokens,
+            "characters": len(self.text),
+            "fingerprint": self.fingerprint,
+            "built_at": self.built_at,
+        }
@@ -0,0 +1,145 @@
+"""Turn vetted example SQL into templates that can be re-bound for a new question."""
+
+import re
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from src.sql_validator import SQLGLOT_DIALECTS, TENANT_COLUMN, _parse
+
+TENANT_SLOT = "service_team_ids"
+
+# ServiceTeamId lists written as prompt placeholders in stored examples, e.g. "IN {ServiceTeamId}"
+_ID_PLACEHOLDER = re.compile(r"\{\s*(?:ids|ServiceTeamIds?)\s*\}", re.IGNORECASE)
+
+# Comparisons whose literal side becomes a parameter
+_PREDICATES = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.Like, exp.ILike, exp.In, exp.Between)
+
+@dataclass
+class Slot:
+    name: str
+    column: str
+    example: str
+    is_string: bool
+
+@dataclass
+class SQLTemplate:
+    statement: Any
+    dialect: str
+    slots: List[Slot] = field(default_factory=list)
+
+    def text(self):
+        """
+        The template as SQL, parameters shown as ``:name``.
+        """
+        return self.statement.sql(dialect=SQLGLOT_DIALECTS.get(self.dialect, self.dialect))
+
+def _is_tenant_column(node):
+    return isinstance(node, exp.Column) and node.name.lower() == TENANT_COLUMN
+
+def _tenant_filter(statement):
+    """
+    Replaces every ``ServiceTeamId IN (...)`` / ``ServiceTeamId = x`` filter with the tenant slot.
+    Returns the number of filters replaced.
+    """
+    replaced = 0
+    for node in list(statement.find_all(exp.In, exp.EQ)):
+        if isinstance(node, exp.In) and _is_tenant_column(node.this) and not node.args.get("query"):
+            column = node.this
+        elif isinstance(node, exp.EQ) and (_is_tenant_column(node.left) or _is_tenant_column(node.right)):
+            column = node.left if _is_tenant_column(node.left) else node.right
+        else:
+            continue
+        node.replace(exp.In(this=column.copy(), expressions=[exp.Placeholder(this=TENANT_SLOT)]))
+        replaced += 1
+    return replaced
+
+def _compared_column(literal):
+    predicate = literal.find_ancestor(*_PREDICATES)
+    if predicate is None:
+        return None
+    column = predicate.find(exp.Column)
+    return column.name if column is not None else ""
+
+@lru_cache(maxsize=1024)
+def parameterize(query, dialect="mssql"):
+    """
+    Parses a stored example query into a template: the ServiceTeamId filter
+    becomes the tenant slot and every literal compared in WHERE/HAVING becomes
+    a named slot. Row limits and literals elsewhere are kept. Templates are
+    cached per query and never modified; ``bind`` works on a copy.
+
+    Args:
+        query (str): The example SQL.
+        dialect (str): SQLDatabase dialect name.
+
+    Returns:
+        SQLTemplate: The template, or None when the query cannot be parsed or has no ServiceTeamId filter.
+    """
+    try:
+        statement = _parse(_ID_PLACEHOLDER.sub("(0)", query), dialect)
+    except (SqlglotError, ValueError):
+        return None
+    if not _tenant_filter(statement):
+        return None
+
+    template = SQLTemplate(statement, dialect)
+    for literal in list(statement.find_all(exp.Literal, bfs=False)):
+        if literal.find_ancestor(exp.Where, exp.Having) is None:
+            continue
+        column = _compared_column(literal)
+        if column is None:
+            continue
+        slot = Slot(f"p{len(template.slots) + 1}", column, str(literal.this), literal.is_string)
+        template.slots.append(slot)
+        literal.replace(exp.Placeholder(this=slot.name))
+    return template
+
+def _literal(value, is_string):
+    if is_string:
+        return exp.Literal.string(str(value))
+    if isinstance(value, bool) or not re.fullmatch(r"-?\d+(\.\d+)?", str(value).strip()):
+        raise ValueError(f"{value!r} is not a number")
+    return exp.Literal.number(str(value).strip())
+
+def bind(template, values, service_team_ids):
+    """
+    Fills a template with parameter values and the caller's ServiceTeamIds.
+
+    Args:
+        template (SQLTemplate): The template from ``parameterize``.
+        values (dict): Slot name -> value; slots without a value keep the example's value.
+        service_team_ids (list): The caller's ServiceTeamIds.
+
+    Returns:
+        str: The SQL query.
+
+    Raises:
+        ValueError: When a numeric slot gets a non-numeric value.
+    """
+    slots = {slot.name: slot for slot in template.slots}
+    ids = [
+        exp.Literal.number(str(team)) if str(team).isdigit() else exp.Literal.string(str(team))
+        for team in service_team_ids
+    ]
+
+    def fill(node):
+        if isinstance(node, exp.In) and [e for e in node.expressions if isinstance(e, exp.Placeholder)
+                                         and e.name == TENANT_SLOT]:
+            return exp.In(this=node.this.copy(), expressions=[i.copy() for i in ids])
+        if isinstance(node, exp.Placeholder) and node.name in slots:
+            slot = slots[node.name]
+            return _literal(values.get(slot.name, slot.example), slot.is_string)
+        return node
+
+    statement = template.statement.copy().transform(fill)
+    return statement.sql(dialect=SQLGLOT_DIALECTS.get(template.dialect, template.dialect))
+
+def slot_descriptions(template) -> List[Dict[str, str]]:
+    """
+    The slots as shown to the binding prompt: name, compared column and the example's value.
+    """
+    return [{"name": slot.name, "column": slot.column, "example": slot.example} for slot in template.slots]
@@ -0,0 +1,439 @@
+"""Local, parser-based checks for agent-generated SQL."""
+
+import logging
+from dataclasses import dataclass
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+INVALID = "invalid"
+UNDECIDED = "undecided"
+
+TENANT_TABLE = "orders"
+TENANT_COLUMN = "serviceteamid"
+
+# SQLDatabase.dialect -> sqlglot dialect
+SQLGLOT_DIALECTS = {
+    "mssql": "tsql",
+    "sqlite": "sqlite",
+    "postgresql": "postgres",
+    "mysql": "mysql",
+}
+
+# Join paths documented in SQL_AGENT_PROMPT_NO_DIGEST, as (table, column, table, column)
+KNOWN_JOINS = [
+    ("Children", "OrderId", "Orders", "Id"),
+    ("Pets", "OrderId", "Orders", "Id"),
+    ("Orders", "TransfereeId", "ApplicationUsers", "Id"),
+    ("Homefindings", "TransfereeId", "ApplicationUsers", "Id"),
+    ("HomeFindingProperties", "HomeFindingId", "Orders", "Id"),
+    ("HomeFindingProperties", "HomeFindingId", "Homefindings", "Id"),
+    ("HomeFindingProperties", "PropertyId", "Properties", "Id"),
+    ("HomeFindingProperties", "PropertyId", "Leases", "PropertyId"),
+    ("Leases", "PropertyId", "Properties", "Id"),
+    ("Tasks", "OrderId", "Orders", "Id"),
+    ("Tasks", "TaskTypeId", "TaskTypes", "Id"),
+    ("AccountPayables", "OrderTransactionSummaryId", "Orders", "Id"),
+    ("AccountReceivables", "OrderTransactionSummaryId", "Orders", "Id"),
+]
+
+_WRITE_NODES = tuple(
+    getattr(exp, name)
+    for name in ("Insert", "Update", "Delete", "Drop", "Create", "Alter", "AlterTable", "Merge",
+                 "Command", "Into", "TruncateTable", "Grant", "Transaction", "Use", "Set")
+    if hasattr(exp, name)
+)
+_UNVERIFIABLE = "The query could not be verified. Simplify it, e.g. without nested subqueries, and try again."
+
+_SET_OPERATIONS = tuple(getattr(exp, name) for name in ("Union", "Intersect", "Except") if hasattr(exp, name))
+
+@dataclass
+class ValidationResult:
+    status: str
+    message: str = ""
+
+    @property
+    def ok(self):
+        return self.status == OK
+
+def _parse(query, dialect):
+    statements = [s for s in sqlglot.parse(query, read=SQLGLOT_DIALECTS.get(dialect, dialect)) if s is not None]
+    if len(statements) != 1:
+        raise ValueError("Only a single SQL statement is allowed.")
+    return statements[0]
+
+def _from_clause(select):
+    return select.args.get("from_") or select.args.get("from")
+
+def _conjuncts(condition):
+    if condition is None:
+        return []
+    while isinstance(condition, exp.Paren):
+        condition = condition.this
+    if isinstance(condition, exp.And):
+        return _conjuncts(condition.left) + _conjuncts(condition.right)
+    return [condition]
+
+def _sources(select):
+    """
+    Returns the FROM/JOIN sources of a SELECT as (alias, table_name or None, node).
+    """
+    nodes = []
+    from_clause = _from_clause(select)
+    if from_clause is not None:
+        nodes.append(from_clause.this)
+        nodes.extend(from_clause.expressions or [])
+    nodes.extend(join.this for join in select.args.get("joins") or [])
+
+    sources = []
+    for node in nodes:
+        if isinstance(node, exp.Table):
+            sources.append(((node.alias_or_name or "").lower(), node.name, node))
+        else:
+            sources.append(((node.alias or "").lower(), None, node))
+    return sources
+
+def _ctes(expression):
+    ctes = {}
+    with_clause = expression.args.get("with_") or expression.args.get("with")
+    if with_clause is not None:
+        for cte in with_clause.expressions:
+            ctes[cte.alias.lower()] = cte.this
+    return ctes
+
+def _literal_values(node):
+    values = []
+    for item in node:
+        while isinstance(item, exp.Paren):
+            item = item.this
+        if not isinstance(item, exp.Literal):
+            return None
+        values.append(str(item.this).lower())
+    return values
+
+def _known_pairs(known_joins):
+    known = set()
+    for table, column, other_table, other_column in known_joins:
+        left, right = (table.lower(), column.lower()), (other_table.lower(), other_column.lower())
+        known.add((left, right))
+        known.add((right, left))
+    return known
+
+def _column_pairs(condition):
+    """
+    Returns the ``column = column`` comparisons among the top-level conjuncts of a condition.
+    """
+    return [
+        c for c in _conjuncts(condition)
+        if isinstance(c, exp.EQ) and isinstance(c.left, exp.Column) and isinstance(c.right, exp.Column)
+    ]
+
+def _tenant_predicates(select, tenant_aliases, single_source, allowed_ids):
+    """
+    Looks for ``<Orders alias>.ServiceTeamId IN (...)`` among the top-level WHERE conjuncts.
+
+    Returns:
+        tuple: (filtered aliases, message) where message explains a predicate that uses foreign IDs.
+    """
+    filtered = set()
+    where = select.args.get("where")
+    for condition in _conjuncts(where.this if where is not None else None):
+        if isinstance(condition, exp.In) and not condition.args.get("query"):
+            column, values = condition.this, _literal_values(condition.expressions)
+        elif isinstance(condition, exp.EQ):
+            column, other = condition.left, condition.right
+            if not isinstance(column, exp.Column):
+                column, other = other, column
+            values = _literal_values([other])
+        else:
+            continue
+        if condition.args.get("not") or not isinstance(column, exp.Column) or column.name.lower() != TENANT_COLUMN:
+            continue
+        table = column.table.lower()
+        if not table and single_source and tenant_aliases:
+            table = next(iter(tenant_aliases))
+        if table not in tenant_aliases:
+            continue
+        if not values:
+            return set(), "The ServiceTeamId filter must list literal ServiceTeamId values."
+        foreign = [v for v in values if v not in allowed_ids]
+        if foreign:
+            return set(), f"ServiceTeamId values {foreign} are not in the user's allowed ServiceTeamIds."
+        filtered.add(table)
+    return filtered, ""
+
+def _join_edges(select, base, known):
+    """
+    Checks the JOINs of a SELECT and collects the known foreign keys linking its base tables.
+
+    Every join needs an ON condition comparing a column of the joined source with
+    a column of another source, and ON comparisons between two base tables must
+    follow a known foreign key. Foreign key comparisons in the WHERE clause link
+    tables too (correlated subqueries).
+
+    Args:
+        select (exp.Select): The SELECT.
+        base (dict): Alias -> lower-cased table name of the base tables in scope, including enclosing queries.
+        known (set): Known join paths from ``_known_pairs``.
+
+    Returns:
+        tuple: (edges, message) with edges as alias pairs, or (None, message) when a join is rejected.
+    """
+    edges = []
+    for join in select.args.get("joins") or []:
+        source = join.this
+        joined = ((source.alias_or_name if isinstance(source, exp.Table) else source.alias) or "").lower()
+        on = join.args.get("on")
+        if join.args.get("kind") == "CROSS" or on is None:
+            return None, (
+                f"Join {source.sql()} with 'JOIN ... ON' on its key columns; "
+                "comma-separated tables, CROSS joins and USING are not allowed."
+            )
+        pairs = [p for p in _column_pairs(on) if p.left.table.lower() != p.right.table.lower()]
+        if not any(joined in (p.left.table.lower(), p.right.table.lower()) for p in pairs):
+            return None, (
+                f"The join condition '{on.sql()}' must compare a key column of {source.sql()} with a column "
+                "of another table, e.g. 'Tasks.OrderId = Orders.Id'."
+            )
+        for pair in pairs:
+            left, right = pair.left.table.lower(), pair.right.table.lower()
+            if left not in base or right not in base:
+                continue  # derived tables are scoped on their own
+            if ((base[left], pair.left.name.lower()), (base[right], pair.right.name.lower())) not in known:
+                return None, f"Joins not backed by a known foreign key: {pair.sql()}"
+            edges.append((left, right))
+
+    where = select.args.get("where")
+    for pair in _column_pairs(where.this if where is not None else None):
+        left, right = pair.left.table.lower(), pair.right.table.lower()
+        if left in base and right in base and left != right and (
+            ((base[left], pair.left.name.lower()), (base[right], pair.right.name.lower())) in known
+        ):
+            edges.append((left, right))
+    return edges, ""
+
+def _reachable(roots, edges):
+    reached = set(roots)
+    changed = True
+    while changed:
+        changed = False
+        for left, right in edges:
+            if (left in reached) != (right in reached):
+                reached.update((left, right))
+                changed = True
+    return reached
+
+def _nested_selects(select):
+    """
+    Yields the subqueries of a SELECT outside its FROM/JOIN sources: in the select
+    list, WHERE, HAVING, ON conditions, ORDER BY, ...
+    """
+    for key, value in select.args.items():
+        if key in ("from_", "from", "with_", "with"):
+            continue
+        for child in (value if isinstance(value, list) else [value]):
+            if not isinstance(child, exp.Expression):
+                continue
+            if isinstance(child, exp.Join):
+                child = child.args.get("on")
+                if child is None:
+                    continue
+            for node in child.walk(prune=lambda n: isinstance(n, exp.Select)):
+                if isinstance(node, exp.Select):
+                    yield node
+
+def _check_scope(node, ctes, allowed_ids, known, anchors=None):
+    """
+    Checks that every row a query node reads is restricted to the allowed ServiceTeamIds.
+
+    Every Orders source must carry the ServiceTeamId filter and every other base
+    table must be joined to one through known foreign keys. Derived tables, CTEs
+    and subqueries anywhere in the query are checked the same way; correlated
+    subqueries may link their tables to the already scoped tables of the
+    enclosing query (``anchors``).
+
+    Returns:
+        tuple: (scoped, message)
+    """
+    anchors = anchors or {}
+    while isinstance(node, (exp.Subquery, exp.Paren)):
+        node = node.this
+    ctes = {**ctes, **_ctes(node)}
+    if isinstance(node, _SET_OPERATIONS):
+        for branch in (node.left, node.right):
+            scoped, message = _check_scope(branch, ctes, allowed_ids, known, anchors)
+            if not scoped:
+                return scoped, message
+        return True, ""
+    if not isinstance(node, exp.Select):
+        return False, "Unsupported query structure."
+
+    sources = _sources(node)
+    local = {alias: table.lower() for alias, table, _ in sources if table and table.lower() not in ctes}
+    tenant_aliases = {alias for alias, table in local.items() if table == TENANT_TABLE}
+
+    for _, table, source in sources:
+        if table is None:
+            scoped, message = _check_scope(source, ctes, allowed_ids, known, anchors)
+        elif table.lower() in ctes:
+            # inside its own body a CTE's name refers to the table it shadows
+            visible = {name: body for name, body in ctes.items() if name != table.lower()}
+            scoped, message = _check_scope(ctes[table.lower()], visible, allowed_ids, known, anchors)
+        else:
+            continue
+        if not scoped:
+            return scoped, message
+
+    base = {**anchors, **local}
+    if local:
+        outer = set(anchors) - set(local)
+        if not tenant_aliases and not outer:
+            return False, (
+                "The query must join the Orders table and filter it with "
+                "'Orders.ServiceTeamId IN (...)' using the user's ServiceTeamIds."
+            )
+        filtered, message = _tenant_predicates(node, tenant_aliases, len(sources) == 1, allowed_ids)
+        if message:
+            return False, message
+        unfiltered = sorted(tenant_aliases - filtered)
+        if unfiltered:
+            return False, (
+                f"The WHERE clause must contain '{unfiltered[0]}.ServiceTeamId IN (...)' with the user's "
+                "ServiceTeamIds for every use of the Orders table, combined with the other conditions using AND."
+            )
+        edges, message = _join_edges(node, base, known)
+        if edges is None:
+            return False, message
+        unjoined = sorted(set(local) - _reachable(filtered | outer, edges))
+        if unjoined:
+            return False, (
+                f"Join {', '.join(unjoined)} to the filtered Orders table through its key columns "
+                "(e.g. 'Tasks.OrderId = Orders.Id') so only the user's rows are read."
+            )
+
+    for subquery in _nested_selects(node):
+        scoped, message = _check_scope(subquery, ctes, allowed_ids, known, base)
+        if not scoped:
+            return scoped, message
+    return True, ""
+
+def check_guarantees(query, service_team_ids, dialect="mssql", foreign_keys=()):
+    """
+    Enforces the hard rules for executing a query: one statement, read-only, and
+    every table it reads restricted to the caller's own ServiceTeamIds, i.e. each
+    Orders source filtered by ``ServiceTeamId IN (...)`` and every other table
+    joined to it through known foreign keys, in subqueries as well. Rowset
+    functions (OPENQUERY, OPENROWSET, ...), other databases and user-defined
+    functions are rejected, as is any query the check fails on.
+
+    Args:
+        query (str): The SQL query.
+        service_team_ids (list): The caller's ServiceTeamIds.
+        dialect (str): SQLDatabase dialect name.
+        foreign_keys (list): Extra (table, column, table, column) join paths, e.g. from the schema catalog.
+
+    Returns:
+        ValidationResult: OK or INVALID.
+    """
+    try:
+        return _check_guarantees(query, service_team_ids, dialect, foreign_keys)
+    except Exception as e:
+        # e.g. RecursionError on deeply nested SQL: never let agent-written SQL crash the tool call
+        logger.warning(f"Tenant guard failed on a query, rejecting it: {e!r}")
+        return ValidationResult(INVALID, _UNVERIFIABLE)
+
+def _check_guarantees(query, service_team_ids, dialect, foreign_keys):
+    if not service_team_ids:
+        return ValidationResult(INVALID, "No ServiceTeamIds are available for this user.")
+    try:
+        statement = _parse(query, dialect)
+    except (SqlglotError, ValueError) as e:
+        return ValidationResult(INVALID, f"The query could not be parsed: {e}")
+
+    if not isinstance(statement, (exp.Select,) + _SET_OPERATIONS) or any(statement.find_all(*_WRITE_NODES)):
+        return ValidationResult(INVALID, "Only read-only SELECT queries are allowed.")
+    for table in statement.find_all(exp.Table):
+        if not isinstance(table.this, exp.Identifier) or table.args.get("catalog"):
+            return ValidationResult(INVALID, (
+                f"{table.sql()} is not allowed: read only the tables of this database, "
+                "without OPENQUERY/OPENROWSET or other databases."
+            ))
+    function = next(statement.find_all(exp.Anonymous), None)
+    if function is not None:
+        return ValidationResult(INVALID, f"The function {function.name} is not allowed; use built-in SQL functions only.")
+
+    allowed_ids = {str(i).lower() for i in service_team_ids}
+    known = _known_pairs(list(KNOWN_JOINS) + list(foreign_keys))
+    scoped, message = _check_scope(statement, {}, allowed_ids, known)
+    if not scoped:
+        return ValidationResult(INVALID, message)
+    return ValidationResult(OK)
+
+def _has_row_limit(statement):
+    if statement.args.get("limit") or statement.args.get("fetch"):
+        return True
+    if isinstance(statement, exp.Select) and not statement.args.get("group"):
+        # an aggregate-only projection returns a single row
+        return all(isinstance(e.unalias(), exp.AggFunc) for e in statement.expressions)
+    return False
+
+def validate_query(query, service_team_ids, dialect="mssql", foreign_keys=()):
+    """
+    Deterministic replacement for the LLM query checker.
+
+    On top of ``check_guarantees`` it requires a row limit (TOP/FETCH/LIMIT or an
+    aggregate-only projection).
+
+    Args:
+        query (str): The SQL query.
+        service_team_ids (list): The caller's ServiceTeamIds.
+        dialect (str): SQLDatabase dialect name.
+        foreign_keys (list): Extra (table, column, table, column) join paths, e.g. from the schema catalog.
+
+    Returns:
+        ValidationResult: OK, INVALID with a reason, or UNDECIDED when the LLM checker should review it.
+    """
+    try:
+        return _validate_query(query, service_team_ids, dialect, foreign_keys)
+    except Exception as e:
+        logger.warning(f"Local query check failed on a query, rejecting it: {e!r}")
+        return ValidationResult(INVALID, _UNVERIFIABLE)
+
+def _validate_query(query, service_team_ids, dialect, foreign_keys):
+    try:
+        statement = _parse(query, dialect)
+    except (SqlglotError, ValueError) as e:
+        return ValidationResult(UNDECIDED, f"The query could not be parsed: {e}")
+
+    result = check_guarantees(query, service_team_ids, dialect, foreign_keys)
+    if not result.ok:
+        return result
+
+    if not _has_row_limit(statement):
+        return ValidationResult(INVALID, "The query must limit the number of rows returned, e.g. with SELECT TOP 5.")
+    return ValidationResult(OK)
+
+def canonicalize(query, dialect="mssql"):
+    """
+    Returns a canonical form of a query so formatting and keyword-case differences
+    map to the same text. Falls back to whitespace normalization when parsing fails.
+    """
+    try:
+        return _parse(query, dialect).sql(dialect=SQLGLOT_DIALECTS.get(dialect, dialect), normalize=True)
+    except (SqlglotError, ValueError):
+        return " ".join(query.split())
+
+def referenced_tables(query, dialect="mssql"):
+    """
+    Returns the lower-cased names of the base tables a query reads, or None when it cannot be parsed.
+    """
+    try:
+        statement = _parse(query, dialect)
+    except (SqlglotError, ValueError):
+        return None
+    cte_names = {cte.alias.lower() for cte in statement.find_all(exp.CTE)}
+    return {table.name.lower() for table in statement.find_all(exp.Table) if table.name.lower() not in cte_names}
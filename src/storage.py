@@ -0,0 +1,163 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, List
+
+from botbuilder.core import Storage, StoreItem
+
+COMPRESS_THRESHOLD = 1024  # bytes; smaller payloads are stored uncompressed
+
+def dumps(value):
+    """
+    Serializes a state item to compact bytes, compressing larger payloads.
+    """
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data)
+    return b"p" + data
+
+def loads(data):
+    if data[:1] == b"z":
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+def _get_e_tag(item):
+    if isinstance(item, dict):
+        return item.get("e_tag")
+    return getattr(item, "e_tag", None)
+
+def _set_e_tag(item, e_tag):
+    if isinstance(item, dict):
+        item["e_tag"] = e_tag
+    else:
+        item.e_tag = e_tag
+
+class SqliteStorage(Storage):
+    """
+    botbuilder Storage backed by a SQLite file, so turn state survives across
+    worker processes sharing the file and across restarts.
+
+    Every item read carries an ``e_tag``. A write with a stale ``e_tag`` raises
+    ``KeyError`` like MemoryStorage does, so concurrent turns of the same
+    conversation on different workers cannot overwrite each other; ``"*"`` or
+    no ``e_tag`` writes unconditionally. Items not written for ``ttl`` seconds
+    are treated as missing and purged.
+    """
+
+    def __init__(self, path, ttl=86400, purge_interval=300):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, e_tag TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)")
+        self._conn.commit()
+
+    def _read(self, keys):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, e_tag FROM state WHERE key IN ({','.join('?' * len(keys))}) AND expires_at > ?",
+                (*keys, now),
+            ).fetchall()
+        data = {}
+        for key, value, e_tag in rows:
+            item = loads(value)
+            _set_e_tag(item, e_tag)
+            data[key] = item
+        return data
+
+    def _write(self, changes):
+        now = time.time()
+        with self._lock:
+            try:
+                for key, change in changes.items():
+                    e_tag = _get_e_tag(change)
+                    if e_tag == "":
+                        raise Exception("sqlite_storage.write(): etag missing")
+                    new_e_tag = uuid.uuid4().hex
+                    value = dumps(change)
+                    if e_tag is None or e_tag == "*":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO state (key, value, e_tag, expires_at) VALUES (?, ?, ?, ?)",
+                            (key, value, new_e_tag, now + self.ttl),
+                        )
+                        continue
+                    updated = self._conn.execute(
+                        "UPDATE state SET value = ?, e_tag = ?, expires_at = ? WHERE key = ? AND e_tag = ?",
+                        (value, new_e_tag, now + self.ttl, key, e_tag),
+                    ).rowcount
+                    if updated:
+                        continue
+                    row = self._conn.execute(
+                        "SELECT e_tag FROM state WHERE key = ? AND expires_at > ?", (key, now)
+                    ).fetchone()
+                    if row is not None:
+                        raise KeyError(
+                            "Etag conflict.\nOriginal: %s\r\nCurrent: %s" % (e_tag, row[0])
+                        )
+                    # the item expired or was deleted since it was read
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO state (key, value, e_tag, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, value, new_e_tag, now + self.ttl),
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        self._purge_if_due(now)
+
+    def _delete(self, keys):
+        with self._lock:
+            self._conn.executemany("DELETE FROM state WHERE key = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    def _purge_if_due(self, now):
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self.purge()
+
+    def purge(self):
+        """
+        Deletes every expired item and returns how many were removed.
+        """
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return removed
+
+    async def read(self, keys: List[str]):
+        if not keys:
+            return {}
+        return await asyncio.to_thread(self._read, list(keys))
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+        await asyncio.to_thread(self._write, changes)
+
+    async def delete(self, keys: List[str]):
+        if not keys:
+            return
+        await asyncio.to_thread(self._delete, list(keys))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
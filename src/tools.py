@@ -14,15 +14,32 @@ from langchain_core.callbacks import (
     CallbackManagerForToolRun,
 )
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain_core.tools import BaseTool
 from langchain_community.tools.sql_database.prompt import QUERY_CHECKER
 from src.query_prompt import CUSTOM_QUERY_CHECKER
+from src.config import Config
+from src.db import run_bounded, run_in_db_executor
+from src.query_guard import check_cost
+from src.result_cache import QueryResultCache
+from src.schema_catalog import SchemaCatalog
+from src.sql_validator import INVALID, OK, check_guarantees, validate_query
+
+def _service_team_ids(config: Optional[RunnableConfig]) -> List[Any]:
+    """Tenant scope of the current run, passed in the run's configurable values."""
+    return ((config or {}).get("configurable") or {}).get("service_team_ids") or []
+
+def _token_counter(config: Optional[RunnableConfig]) -> Optional[Any]:
+    """Token count function of the tokenizer passed in the run's configurable values, if any."""
+    tokenizer = ((config or {}).get("configurable") or {}).get("tokenizer")
+    return (lambda text: len(tokenizer.encode(text))) if tokenizer is not None else None
 
 class BaseSQLDatabaseTool(BaseModel):
     """Base tool for interacting with a SQL database."""
 
     db: SQLDatabase = Field(exclude=True)
+    catalog: Optional[SchemaCatalog] = Field(default=None, exclude=True)
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -42,16 +59,69 @@ class QuerySQLDatabaseTool(BaseTool):
     """
     args_schema: Type[BaseModel] = _QuerySQLDatabaseToolInput
     db: SQLDatabase
+    catalog: Optional[SchemaCatalog] = Field(default=None, exclude=True)
+    result_cache: Optional[QueryResultCache] = Field(default=None, exclude=True)
+    max_rows: int = Config.SQL_RESULT_MAX_ROWS
+    max_tokens: int = Config.SQL_RESULT_MAX_TOKENS
+
+    def _foreign_keys(self) -> Sequence[Tuple[str, str, str, str]]:
+        """Join paths declared in the database, on top of the documented ones."""
+        return self.catalog.join_paths() if self.catalog is not None else ()
+
+    def _execute(
+        self, query: str, service_team_ids: List[Any], count_tokens: Optional[Any] = None
+    ) -> Union[str, Sequence[Dict[str, Any]], Result]:
+        """Run the query within the row and token budgets, serving repeated queries for the same tenant scope from the result cache.
+        Queries whose estimated plan is too expensive are rejected, and execution is cancelled past the statement timeout."""
+        if self.result_cache is not None:
+            cached = self.result_cache.get(query, service_team_ids, self.db.dialect)
+            if cached is not None:
+                return cached
+        if Config.SQL_COST_GUARD_ENABLED:
+            rejected = check_cost(self.db, query, Config.SQL_MAX_ESTIMATED_COST, Config.SQL_MAX_ESTIMATED_ROWS)
+            if rejected is not None:
+                return rejected
+        result = run_bounded(
+            self.db,
+            query,
+            max_rows=self.max_rows,
+            max_tokens=self.max_tokens,
+            count_tokens=count_tokens,
+            batch_size=Config.SQL_FETCH_BATCH_SIZE,
+            count_limit=Config.SQL_ROW_COUNT_LIMIT,
+            timeout=Config.SQL_STATEMENT_TIMEOUT,
+        )
+        if self.result_cache is not None and not str(result).startswith("Error:"):
+            self.result_cache.set(query, service_team_ids, result, self.db.dialect)
+        return result
 
     def _run(
         self, query: str, 
-        run_manager: Optional[Any] = None
+        run_manager: Optional[Any] = None,
+        *,
+        config: RunnableConfig,
     ) -> Union[str, Sequence[Dict[str, Any]], Result]:
         """Execute the query, return the results or an error message."""
-        if 'ServiceTeamId' not in query:
-            return "Error: Query must include 'ServiceTeamId'."
-        return self.db.run_no_throw(query)
-    
+        service_team_ids = _service_team_ids(config)
+        result = check_guarantees(query, service_team_ids, self.db.dialect, self._foreign_keys())
+        if not result.ok:
+            return f"Error: {result.message}"
+        return self._execute(query, service_team_ids, _token_counter(config))
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        *,
+        config: RunnableConfig,
+    ) -> Union[str, Sequence[Dict[str, Any]], Result]:
+        """Execute the query on the database thread pool."""
+        service_team_ids = _service_team_ids(config)
+        result = check_guarantees(query, service_team_ids, self.db.dialect, self._foreign_keys())
+        if not result.ok:
+            return f"Error: {result.message}"
+        return await run_in_db_executor(self._execute, query, service_team_ids, _token_counter(config))
+
 
 @deprecated(
     since="0.3.12",
@@ -89,10 +159,29 @@ class InfoSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[overri
         run_manager: Optional[CallbackManagerForToolRun] = None,
     ) -> str:
         """Get the schema for tables in a comma-separated list."""
+        if self.catalog is not None:
+            return self.catalog.get_table_info_no_throw(
+                [t.strip() for t in table_names.split(",")]
+            )
         return self.db.get_table_info_no_throw(
             [t.strip() for t in table_names.split(",")]
         )
 
+    async def _arun(
+        self,
+        table_names: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        """Get the schema for tables, from the catalog or on the database thread pool."""
+        if self.catalog is not None:
+            return self.catalog.get_table_info_no_throw(
+                [t.strip() for t in table_names.split(",")]
+            )
+        return await run_in_db_executor(
+            self.db.get_table_info_no_throw,
+            [t.strip() for t in table_names.split(",")],
+        )
+
 
 class _ListSQLDatabaseToolInput(BaseModel):
     tool_input: str = Field("", description="An empty string")
@@ -111,15 +200,28 @@ class ListSQLDatabaseTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[overri
         run_manager: Optional[CallbackManagerForToolRun] = None,
     ) -> str:
         """Get a comma-separated list of table names."""
+        if self.catalog is not None:
+            return ", ".join(self.catalog.get_usable_table_names())
         return ", ".join(self.db.get_usable_table_names())
 
+    async def _arun(
+        self,
+        tool_input: str = "",
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        """Get a comma-separated list of table names, from the catalog or on the database thread pool."""
+        if self.catalog is not None:
+            return ", ".join(self.catalog.get_usable_table_names())
+        table_names = await run_in_db_executor(self.db.get_usable_table_names)
+        return ", ".join(table_names)
+
 
 class _QuerySQLCheckerToolInput(BaseModel):
     query: str = Field(..., description="A detailed and SQL query to be checked.")
 
 
 class QuerySQLCheckerTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[override, override]
-    """Use an LLM to check if a query is correct.
+    """Check if a query is correct, locally first and with an LLM when the local check cannot decide.
     Adapted from https://www.patterns.app/blog/2023/01/18/crunchbot-sql-analyst-gpt/"""
 
     template: str = CUSTOM_QUERY_CHECKER
@@ -137,7 +239,11 @@ class QuerySQLCheckerTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[overri
     @classmethod
     def initialize_llm_chain(cls, values: Dict[str, Any]) -> Any:
         if "llm_chain" not in values:
-            from langchain.chains.llm import LLMChain
+            try:
+                from langchain.chains.llm import LLMChain
+            except ImportError:
+                # LLMChain moved to langchain-classic in langchain 1.0
+                from langchain_classic.chains.llm import LLMChain
 
             values["llm_chain"] = LLMChain(
                 llm=values.get("llm"),  # type: ignore[arg-type]
@@ -153,12 +259,27 @@ class QuerySQLCheckerTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[overri
 
         return values
 
+    def _check_locally(self, query: str, config: RunnableConfig) -> Optional[str]:
+        """Return the checker output when the local validator can decide, else None."""
+        foreign_keys = self.catalog.join_paths() if self.catalog is not None else ()
+        result = validate_query(query, _service_team_ids(config), self.db.dialect, foreign_keys)
+        if result.status == OK:
+            return query
+        if result.status == INVALID:
+            return f"Error: {result.message} Rewrite the query and check it again."
+        return None
+
     def _run(
         self,
         query: str,
         run_manager: Optional[CallbackManagerForToolRun] = None,
+        *,
+        config: RunnableConfig,
     ) -> str:
-        """Use the LLM to check the query."""
+        """Check the query locally, falling back to the LLM."""
+        checked = self._check_locally(query, config)
+        if checked is not None:
+            return checked
         return self.llm_chain.predict(
             query=query,
             dialect=self.db.dialect,
@@ -169,7 +290,12 @@ class QuerySQLCheckerTool(BaseSQLDatabaseTool, BaseTool):  # type: ignore[overri
         self,
         query: str,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        *,
+        config: RunnableConfig,
     ) -> str:
+        checked = self._check_locally(query, config)
+        if checked is not None:
+            return checked
         return await self.llm_chain.apredict(
             query=query,
             dialect=self.db.dialect,
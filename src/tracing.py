@@ -0,0 +1,294 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """
+    One timed stage of a turn. Spans nest through a context variable, so a span
+    started inside another (in the same task, a task it created, or a thread
+    it handed its context to) becomes its child.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        tracer.export(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class JsonLinesExporter:
+    """
+    Appends every finished span as one JSON object per line.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class Histogram:
+    """
+    Prometheus-style histogram with one set of cumulative buckets per label value.
+    """
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {total}')
+                lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {count}')
+        return "\n".join(lines)
+
+class Counter:
+    """
+    Prometheus-style counter with one value per label value.
+    """
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return "\n".join(lines)
+
+class Gauge:
+    """
+    Prometheus-style gauge with one value per label value, read from ``collect`` when rendered.
+    """
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.collect = dict  # replaced by the owner of the measured resource
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label_value, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return "\n".join(lines)
+
+stage_seconds = Histogram("bot_stage_duration_seconds", "Time spent in each stage of a turn.", "stage")
+sql_rows = Histogram("bot_sql_rows", "Rows produced by sql_db_query executions.", "kind", buckets=ROW_BUCKETS)
+llm_tokens = Counter("bot_llm_tokens_total", "Tokens used by LLM calls.", "kind")
+stage_errors = Counter("bot_stage_errors_total", "Stages that ended with an error.", "stage")
+budget_exceeded = Counter("bot_agent_budget_exceeded_total", "Agent runs ended early by a per-turn budget.", "budget")
+fast_path = Counter("bot_fast_path_total", "Questions tried on the template fast path, by outcome.", "outcome")
+sql_guard = Counter("bot_sql_guard_total", "Queries rejected by the cost guard or cancelled by the statement timeout.", "reason")
+db_pool_wait = Histogram("bot_db_pool_wait_seconds", "Time spent getting a database connection from the pool.", "outcome")
+db_pool_connections = Gauge("bot_db_pool_connections", "Database pool connections by state.", "state")
+db_pool_saturation = Gauge("bot_db_pool_saturation", "Checked-out database connections over the pool's capacity.", "route")
+
+class Tracer:
+    """
+    Hands finished spans to the registered exporters and records their duration in the stage histogram.
+    """
+
+    def __init__(self):
+        self.exporters = []
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def export(self, span):
+        stage_seconds.observe(span.name, span.duration)
+        if span.error is not None:
+            stage_errors.inc(span.name)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Failed to export span {span.name}: {e}")
+
+    def close(self):
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+tracer = Tracer()
+
+def current_span():
+    return _current_span.get()
+
+def start_span(name, parent=None, **attributes):
+    """
+    Starts a span without making it current, for stages that begin and end in different callbacks.
+    """
+    return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times the enclosed block as a span, nested under the current span.
+    """
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def render_metrics():
+    """
+    Returns all metrics in the Prometheus text exposition format.
+    """
+    metrics = (
+        stage_seconds, stage_errors, sql_rows, llm_tokens, budget_exceeded, fast_path, sql_guard,
+        db_pool_wait, db_pool_connections, db_pool_saturation,
+    )
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler that records a span for every tool call and LLM
+    call of the agent, with prompt and completion token counts for LLM calls.
+    """
+
+    # run in the event loop with the caller's context, so spans nest under the turn and stay ordered
+    run_inline = True
+
+    def __init__(self):
+        self._spans = {}
+
+    def _start(self, run_id: UUID, name: str, **attributes):
+        self._spans[run_id] = start_span(name, **attributes)
+
+    def _end(self, run_id: UUID, error=None):
+        current = self._spans.pop(run_id, None)
+        if current is not None:
+            current.end(error=error)
+        return current
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, f"tool.{(serialized or {}).get('name') or kwargs.get('name', 'unknown')}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        current = self._spans.get(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    usage = {
+                        "prompt_tokens": metadata.get("input_tokens", 0),
+                        "completion_tokens": metadata.get("output_tokens", 0),
+                    }
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        llm_tokens.inc("prompt", prompt_tokens)
+        llm_tokens.inc("completion", completion_tokens)
+        if current is not None:
+            current.set("prompt_tokens", prompt_tokens)
+            current.set("completion_tokens", completion_tokens)
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+tracing_handler = TracingCallbackHandler()
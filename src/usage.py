@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.config import Config
+
+def user_key(context):
+    """
+    Identifies the user who sent the turn's activity, or None when it carries no sender.
+    """
+    sender = context.activity.from_property if context is not None and context.activity else None
+    return (getattr(sender, "aad_object_id", None) or getattr(sender, "id", None)) if sender else None
+
+def _empty_usage():
+    return {
+        "turns": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "total_cost": 0.0,
+        "agent_seconds": 0.0,
+        "budget_exceeded": 0,
+        "last_seen": 0.0,
+    }
+
+class UsageCounters:
+    """
+    Agent usage (turns, tokens, cost, time, exceeded budgets) per user and per
+    ServiceTeamId, for capacity planning. A turn counts toward every
+    ServiceTeamId of the user who ran it. The least recently seen keys are
+    dropped beyond ``max_keys`` per dimension; the totals keep everything.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.totals = _empty_usage()
+        self._users = OrderedDict()
+        self._teams = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _accumulate(entry, usage, now):
+        for name, value in usage.items():
+            entry[name] += value
+        entry["last_seen"] = now
+
+    def _add(self, table, key, usage, now):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = _empty_usage()
+            while len(table) > self.max_keys:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        self._accumulate(entry, usage, now)
+
+    def record(self, user, service_team_ids, prompt_tokens=0, completion_tokens=0, total_cost=0.0,
+               agent_seconds=0.0, budget_exceeded=False):
+        """
+        Adds one agent run to the counters of ``user`` and of each of ``service_team_ids``.
+        """
+        usage = {
+            "turns": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "total_cost": total_cost,
+            "agent_seconds": agent_seconds,
+            "budget_exceeded": int(budget_exceeded),
+        }
+        now = time.time()
+        with self._lock:
+            self._accumulate(self.totals, usage, now)
+            self._add(self._users, user or "anonymous", usage, now)
+            for team in {str(team) for team in service_team_ids or []}:
+                self._add(self._teams, team, usage, now)
+
+    def stats(self, top=20):
+        """
+        Returns the totals and the ``top`` ServiceTeamIds by tokens used. Users are
+        only counted; their identifiers never leave the process.
+        """
+        def heaviest(table):
+            ranked = sorted(table.items(), key=lambda item: item[1]["total_tokens"], reverse=True)
+            return {key: dict(entry) for key, entry in ranked[:top]}
+
+        with self._lock:
+            return {
+                "totals": dict(self.totals),
+                "service_teams": heaviest(self._teams),
+                "tracked_users": len(self._users),
+                "tracked_service_teams": len(self._teams),
+            }
+
+usage_counters = UsageCounters(max_keys=Config.USAGE_MAX_KEYS)
@@ -1,39 +1,191 @@
-from azure.data.tables import TableServiceClient, TableEntity,UpdateMode
-from azure.core.credentials import AzureNamedKeyCredential
+import asyncio
+import time
 import uuid
+from datetime import datetime, timezone
+
+from azure.data.tables import TableEntity
+from azure.data.tables.aio import TableClient
+from azure.core.credentials import AzureNamedKeyCredential
 
 from src.config import Config
+from src.registry import registry
 config = Config()
 
+MAX_BATCH_SIZE = 100  # entities per table transaction allowed by the service
+MAX_PROPERTY_BYTES = 64 * 1024  # UTF-16 size of a string property allowed by the service
+TRUNCATED = " …[truncated]"
+
 credential = AzureNamedKeyCredential(config.COSMOS_ACCOUNT_NAME, config.COSMOS_ACCOUNT_KEY)
-# Connect to Cosmos DB Table
-table_service = TableServiceClient(
-    endpoint=f"https://{config.COSMOS_ACCOUNT_NAME}.table.cosmos.azure.com",
-    credential=credential
-    )
-table_client = table_service.get_table_client(config.COSMOS_TABLE_NAME)
-print("Connected to Cosmos DB Table successfully.")
-
-def store_chat_in_cosmos(question, sql_query, response, context):
-    """
-    stores each instance of the conversation in Cosmos DB
-    """
-    try:
-        # Generate a unique ID for this conversation
-        row_key = str(uuid.uuid4())
-        
-        entity = TableEntity()
-        entity["PartitionKey"] = "ChatBot"
-        entity["RowKey"] = row_key
-        entity["Question"] = question
-        entity["SQLQuery"] = sql_query if sql_query else "N/A"
-        entity["Response"] = response
-
-        
-        table_client.create_entity(entity)
-        print("Data successfully uploaded to Cosmos DB Table.")
-
-        return row_key
-
-    except Exception as e:
-        print(f"Error uploading data to Cosmos DB: {e}")
\ No newline at end of file
+COSMOS_TABLE_ENDPOINT = f"https://{config.COSMOS_ACCOUNT_NAME}.table.cosmos.azure.com"
+
+registry.register(
+    "chat_log_table",
+    lambda: TableClient(endpoint=COSMOS_TABLE_ENDPOINT, table_name=config.COSMOS_TABLE_NAME, credential=credential),
+)
+
+def partition_key(service_team_ids=None, now=None):
+    """
+    Builds the PartitionKey for a chat log entity from the day and the user's service team,
+    so writes spread over many partitions instead of a single hot one.
+    """
+    now = now or datetime.now(timezone.utc)
+    team = min(service_team_ids, key=str) if service_team_ids else "none"
+    return f"{now:%Y%m%d}_{team}"
+
+class ChatLogWriter:
+    """
+    Background writer that stores chat log entities in Cosmos DB Table storage.
+
+    Entities go into a bounded in-memory queue without waiting on the network.
+    A worker task groups them by PartitionKey and writes them in transactional
+    batches once ``batch_size`` entities are waiting or ``flush_interval``
+    seconds have passed. When the queue is full new entities are dropped and
+    counted rather than slowing down the reply path.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=MAX_BATCH_SIZE, flush_interval=2.0):
+        self.max_queue_size = max_queue_size
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.table_client = None
+        self._worker = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        """
+        Creates the async table client and starts the worker task on the running event loop.
+        """
+        if self._worker is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.table_client = registry.get("chat_log_table")
+        self._worker = asyncio.create_task(self._run())
+
+    def log(self, entity):
+        """
+        Queues an entity for writing. Never blocks; returns False when the entity was dropped.
+        """
+        if self.queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(entity)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, entities):
+        partitions = {}
+        for entity in entities:
+            partitions.setdefault(entity["PartitionKey"], []).append(entity)
+        for partition in partitions.values():
+            for i in range(0, len(partition), MAX_BATCH_SIZE):
+                chunk = partition[i:i + MAX_BATCH_SIZE]
+                try:
+                    await self.table_client.submit_transaction([("create", entity) for entity in chunk])
+                    self.written += len(chunk)
+                    self.batches += 1
+                except Exception as e:
+                    print(f"Error uploading chat logs to Cosmos DB: {e}")
+                    if len(chunk) == 1:
+                        self.failed += 1
+                    else:
+                        # one bad entity fails the whole transaction, so write the rest on their own
+                        await self._write_each(chunk)
+
+    async def _write_each(self, entities):
+        for entity in entities:
+            try:
+                await self.table_client.create_entity(entity)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error uploading chat log {entity['RowKey']} to Cosmos DB: {e}")
+
+    async def stop(self, timeout=10.0):
+        """
+        Writes out the queued entities, waiting at most ``timeout`` seconds, then stops the worker.
+        """
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Chat log drain timed out with {self.queue.qsize()} entities queued.")
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self.table_client.close()
+        registry.discard("chat_log_table")
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+chat_log_writer = ChatLogWriter(
+    max_queue_size=config.CHAT_LOG_QUEUE_SIZE,
+    batch_size=config.CHAT_LOG_BATCH_SIZE,
+    flush_interval=config.CHAT_LOG_FLUSH_INTERVAL,
+)
+
+def _fit_property(value):
+    """
+    Truncates a string property to the service's size limit, so one long answer cannot fail a whole batch.
+    """
+    if not isinstance(value, str) or len(value.encode("utf-16-le")) <= MAX_PROPERTY_BYTES:
+        return value
+    budget = MAX_PROPERTY_BYTES - len(TRUNCATED.encode("utf-16-le"))
+    truncated = value.encode("utf-16-le")[:budget].decode("utf-16-le", errors="ignore")
+    return truncated + TRUNCATED
+
+def store_chat_in_cosmos(question, sql_query, response, context, service_team_ids=None):
+    """
+    stores each instance of the conversation in Cosmos DB, through the background chat log writer
+    """
+    # Generate a unique ID for this conversation
+    row_key = str(uuid.uuid4())
+
+    entity = TableEntity()
+    entity["PartitionKey"] = partition_key(service_team_ids)
+    entity["RowKey"] = row_key
+    entity["Question"] = _fit_property(question)
+    entity["SQLQuery"] = _fit_property(sql_query) if sql_query else "N/A"
+    entity["Response"] = _fit_property(response)
+
+    if not chat_log_writer.log(entity):
+        print("Chat log queue is full or not started, dropping log entry.")
+    return row_key
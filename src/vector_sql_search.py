@@ -1,11 +1,21 @@
+import json
+import logging
+import threading
 from langchain_openai import AzureOpenAIEmbeddings
 from langchain_community.vectorstores.azuresearch import AzureSearch
 
 from src.config import Config
+from src.embedding_cache import CachedEmbeddings
+from src.local_index import FewShotIndex
+from src.registry import registry
+from src.tracing import span
 config = Config()
+logger = logging.getLogger(__name__)
 
 AZURESEARCH_FIELDS_CONTENT = config.AZURESEARCH_FIELDS_CONTENT
-AZURESEARCH_FIELDS_CONTENT_VECTOR = config.AZURESEARCH_FIELDS_CONTENT_VECTOR   
+AZURESEARCH_FIELDS_CONTENT_VECTOR = config.AZURESEARCH_FIELDS_CONTENT_VECTOR
+AZURESEARCH_FIELDS_METADATA = "metadata"
+TOP_K = 3
 
 embeddings = AzureOpenAIEmbeddings(
     azure_deployment=config.OPENAI_DEPOLYMENT_ID_ADA,
@@ -14,31 +24,190 @@ embeddings = AzureOpenAIEmbeddings(
     api_key=config.OPENAI_KEY,
 )
 
-vector_store = AzureSearch(
-    azure_search_endpoint=config.AI_SEARCH_ENDPOINT,
-    azure_search_key=config.AI_SEARCH_API_KEY,
-    index_name=config.AI_SEARCH_INDEX,
-    embedding_function=embeddings.embed_query,
-    additional_search_client_options={"retry_total": 4},
-    semantic_configuration_name=config.AI_SEARCH_SEMANTIC_CONFIG_NAME
+# Users rephrase the same questions all day, so query vectors are cached in memory and on disk
+cached_embeddings = CachedEmbeddings(
+    embeddings,
+    model_name=config.OPENAI_EMBEDDING_MODEL,
+    memory_size=config.EMBEDDING_CACHE_SIZE,
+    path=config.EMBEDDING_CACHE_PATH,
 )
-retriever = vector_store.as_retriever(search_type="semantic_hybrid", k=3)
+
+# The AzureSearch client checks the index on construction, so it is built on first use
+def _build_vector_store():
+    return AzureSearch(
+        azure_search_endpoint=config.AI_SEARCH_ENDPOINT,
+        azure_search_key=config.AI_SEARCH_API_KEY,
+        index_name=config.AI_SEARCH_INDEX,
+        embedding_function=cached_embeddings,
+        additional_search_client_options={"retry_total": 4},
+        semantic_configuration_name=config.AI_SEARCH_SEMANTIC_CONFIG_NAME
+    )
+
+registry.register("vector_store", _build_vector_store)
+registry.register(
+    "retriever",
+    lambda: registry.get("vector_store").as_retriever(search_type="semantic_hybrid", k=TOP_K),
+)
+
+# Local snapshot of the few-shot examples, searched in-process before falling back to Azure AI Search
+fewshot_index = FewShotIndex()
+try:
+    fewshot_index.load_file(config.FEWSHOT_SNAPSHOT_PATH)
+except (OSError, ValueError) as e:
+    print(f"Failed to load few-shot snapshot: {e}")
+
+_refresh_thread = None
+_refresh_stop = threading.Event()
+
+def _load_examples_from_index():
+    examples = []
+    for result in registry.get("vector_store").client.search(search_text="*", top=config.FEWSHOT_MAX_EXAMPLES):
+        metadata = result.get(AZURESEARCH_FIELDS_METADATA) or {}
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        examples.append({
+            "content": result.get(AZURESEARCH_FIELDS_CONTENT) or "",
+            "sqlQuery": result.get("sqlQuery") or metadata.get("sqlQuery"),
+            "vector": result.get(AZURESEARCH_FIELDS_CONTENT_VECTOR),
+        })
+
+    # vectors are not always retrievable from the index, embed those examples ourselves
+    missing = [e for e in examples if not e["vector"] and e["content"] and e["sqlQuery"]]
+    if missing:
+        vectors = embeddings.embed_documents([e["content"] for e in missing])
+        for example, vector in zip(missing, vectors):
+            example["vector"] = vector
+    return examples
+
+def refresh_fewshot_index():
+    """
+    Reloads the local few-shot index from Azure AI Search and writes the snapshot file.
+    """
+    try:
+        fewshot_index.load(_load_examples_from_index())
+        fewshot_index.save(config.FEWSHOT_SNAPSHOT_PATH)
+        print(f"Few-shot index refreshed with {len(fewshot_index)} examples.")
+    except Exception as e:
+        print(f"Failed to refresh few-shot index: {e}")
+
+def start_fewshot_refresh():
+    """
+    Starts a daemon thread that refreshes the local few-shot index every FEWSHOT_REFRESH_INTERVAL seconds.
+    """
+    global _refresh_thread
+    if not config.LOCAL_RETRIEVAL_ENABLED or _refresh_thread is not None:
+        return
+
+    def _refresh_loop():
+        if fewshot_index.is_stale(config.FEWSHOT_REFRESH_INTERVAL):
+            refresh_fewshot_index()
+        while not _refresh_stop.wait(config.FEWSHOT_REFRESH_INTERVAL):
+            refresh_fewshot_index()
+
+    _refresh_thread = threading.Thread(target=_refresh_loop, name="fewshot-refresh", daemon=True)
+    _refresh_thread.start()
+
+def stop_fewshot_refresh():
+    _refresh_stop.set()
+
+def _use_local_index():
+    return config.LOCAL_RETRIEVAL_ENABLED and not fewshot_index.is_stale(config.FEWSHOT_MAX_AGE)
+
+def _search_local(query, query_vector):
+    results = fewshot_index.search(query, query_vector, k=TOP_K)
+    # a weak best match counts as a miss, let Azure AI Search's semantic ranker decide
+    if not results or results[0]["similarity"] < config.FEWSHOT_MIN_SIMILARITY:
+        return None
+    return [
+        {"content": result["content"], "sqlQuery": result["sqlQuery"], "similarity": result["similarity"]}
+        for result in results
+    ]
+
+def _examples_from_docs(docs):
+    # the semantic ranker's scores are not comparable to cosine similarity, so they are left out
+    return [
+        {"content": doc.page_content, "sqlQuery": doc.metadata["sqlQuery"], "similarity": None}
+        for doc in docs if doc.metadata.get("sqlQuery")
+    ]
+
+def sample_queries(examples):
+    """
+    The SQL of retrieved examples, as formatted into the agent prompt.
+    """
+    return [example["sqlQuery"] for example in examples] if examples is not None else None
 
 def retrieve_docs(query):
     """
     Retrieves relevant documents from Azure AI Search using semantic hybrid search.
+    The local few-shot index is tried first when its snapshot is fresh.
 
     Args:
         query (str): The search query.
-        k (int): Number of documents to retrieve.
 
     Returns:
         list: A list of retrieved documents.
     """
-    try:
-
-        docs = retriever.invoke(query)
-        return [doc.metadata.get("sqlQuery", "") for doc in docs if doc.metadata.get("sqlQuery")]
+    if _use_local_index():
+        try:
+            local_examples = _search_local(query, cached_embeddings.embed_query(query))
+        except Exception as e:
+            # e.g. a vector dimension mismatch or a corrupt snapshot: Azure AI Search still answers
+            logger.warning(f"Local few-shot search failed, falling back to Azure AI Search: {e!r}")
+            local_examples = None
+        if local_examples:
+            return sample_queries(local_examples)
 
+    try:
+        docs = registry.get("retriever").invoke(query)
     except Exception as e:
+        logger.warning(f"Azure AI Search retrieval failed: {e!r}")
         return None
+    return sample_queries(_examples_from_docs(docs))
+
+async def aretrieve_examples(query):
+    """
+    Async retrieval of the examples closest to a query, using the async search client and async embeddings.
+    The local few-shot index is tried first when its snapshot is fresh.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        list: Dicts with the example question (``content``), its ``sqlQuery`` and its cosine
+        ``similarity`` to the query (None for Azure AI Search results), best first. None on failure.
+    """
+    with span("retrieval") as current:
+        if _use_local_index():
+            try:
+                with span("embedding"):
+                    query_vector = await cached_embeddings.aembed_query(query)
+                local_examples = _search_local(query, query_vector)
+            except Exception as e:
+                logger.warning(f"Local few-shot search failed, falling back to Azure AI Search: {e!r}")
+                current.set("local_error", type(e).__name__)
+                local_examples = None
+            if local_examples:
+                current.set("source", "local")
+                return local_examples
+
+        current.set("source", "azure")
+        try:
+            retriever = await registry.aget("retriever")
+            docs = await retriever.ainvoke(query)
+        except Exception as e:
+            logger.warning(f"Azure AI Search retrieval failed: {e!r}")
+            current.set("error", type(e).__name__)
+            return None
+        return _examples_from_docs(docs)
+
+async def aretrieve_docs(query):
+    """
+    Async version of retrieve_docs, uses the async search client and async embeddings.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        list: A list of retrieved documents.
+    """
+    return sample_queries(await aretrieve_examples(query))
@@ -0,0 +1,17 @@
+import os
+
+# src.config reads the deployment's settings at import time; tests only need them to exist
+for name in (
+    "TEAMS_APP_TENANT_ID", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_MODEL_DEPLOYMENT_NAME",
+    "AZURE_OPENAI_TEXT_MODEL_NAME", "STORAGE_ACCOUNT", "STORAGE_KEY", "STORAGE_CONTAINER",
+    "AI_SEARCH_SERVICE", "AI_SEARCH_INDEX", "AI_SEARCH_API_KEY", "AI_SEARCH_CATEGORY",
+    "AI_SEARCH_SEMANTIC_CONFIG_NAME", "AZURESEARCH_FIELDS_CONTENT", "AZURESEARCH_FIELDS_CONTENT_VECTOR",
+    "OPENAI_KEY", "OPENAI_DEPOLYMENT_ID_ADA", "OPENAI_EMBEDDING_MODEL", "SERVICEID_TOKEN",
+    "COSMOS_ACCOUNT_NAME", "COSMOS_ACCOUNT_KEY", "COSMOS_TABLE_NAME",
+):
+    os.environ.setdefault(name, "test")
+for name in ("AZURE_OPENAI_ENDPOINT", "AI_SEARCH_ENDPOINT", "OPENAI_ENDPOINT", "SERVICEID_TOKEN_REQUEST_URL"):
+    os.environ.setdefault(name, "https://localhost.invalid/")
+os.environ.setdefault("DATABASE_CONNECTION_STRING", "sqlite://")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("FEWSHOT_SNAPSHOT_PATH", "")
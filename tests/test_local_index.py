@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src import vector_sql_search
+from src.local_index import RRF_K, FewShotIndex, tokenize
+
+EXAMPLES = [
+    {"content": "How many pets does each transferee have", "sqlQuery": "SELECT 1", "vector": [1.0, 0.0, 0.0]},
+    {"content": "List the open tasks of an order", "sqlQuery": "SELECT 2", "vector": [0.0, 1.0, 0.0]},
+    {"content": "Which leases end this month", "sqlQuery": "SELECT 3", "vector": [0.0, 0.0, 1.0]},
+    {"content": "Examples without SQL are skipped", "sqlQuery": "", "vector": [1.0, 1.0, 1.0]},
+]
+
+@pytest.fixture
+def index():
+    index = FewShotIndex()
+    index.load(EXAMPLES)
+    return index
+
+def test_load_skips_examples_without_sql_or_vector(index):
+    assert len(index) == 3
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+
+def test_bm25_scores_only_documents_sharing_terms(index):
+    scores = index._bm25("open tasks", index._doc_lengths)
+    assert scores[1] > 0
+    assert scores[0] == 0 and scores[2] == 0
+
+def test_search_fuses_vector_and_keyword_ranks(index):
+    # the vector points at the pets example, the keywords at the tasks example
+    results = index.search("open tasks order", [0.9, 0.1, 0.0], k=3)
+    assert [r["sqlQuery"] for r in results[:2]] == ["SELECT 2", "SELECT 1"]
+    assert results[0]["score"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert results[1]["similarity"] == pytest.approx(0.9 / np.linalg.norm([0.9, 0.1]))
+
+def test_snapshot_round_trip(index, tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    index.save(path)
+    loaded = FewShotIndex()
+    assert loaded.load_file(path)
+    assert loaded.search("leases", [0.0, 0.0, 1.0], k=1)[0]["sqlQuery"] == "SELECT 3"
+    assert not FewShotIndex().load_file(str(tmp_path / "missing.json"))
+
+def test_tokenize_lowercases_words():
+    assert tokenize("Open TASKS, order#7") == ["open", "tasks", "order", "7"]
+
+class _Embeddings:
+    async def aembed_query(self, query):
+        return [1.0, 0.0]  # two dimensions against a three-dimensional index
+
+    def embed_query(self, query):
+        return [1.0, 0.0]
+
+class _Doc:
+    page_content = "from the search service"
+    metadata = {"sqlQuery": "SELECT 42"}
+
+class _Retriever:
+    def invoke(self, query):
+        return [_Doc()]
+
+    async def ainvoke(self, query):
+        return [_Doc()]
+
+@pytest.fixture
+def broken_local_index(index, monkeypatch):
+    monkeypatch.setattr(vector_sql_search, "fewshot_index", index)
+    monkeypatch.setattr(vector_sql_search, "cached_embeddings", _Embeddings())
+    monkeypatch.setattr(vector_sql_search.config, "LOCAL_RETRIEVAL_ENABLED", True)
+    registry = vector_sql_search.registry
+    monkeypatch.setitem(registry._factories, "retriever", _Retriever)
+    registry.discard("retriever")
+    yield
+    registry.discard("retriever")
+
+def test_local_index_errors_fall_back_to_azure_search(broken_local_index):
+    examples = asyncio.run(vector_sql_search.aretrieve_examples("open tasks"))
+    assert [e["sqlQuery"] for e in examples] == ["SELECT 42"]
+    assert vector_sql_search.retrieve_docs("open tasks") == ["SELECT 42"]
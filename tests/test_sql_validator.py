@@ -0,0 +1,102 @@
+import pytest
+
+from src.sql_validator import INVALID, OK, check_guarantees, validate_query
+
+IDS = [1, 2]
+
+SCOPED = [
+    "SELECT TOP 5 * FROM Orders WHERE ServiceTeamId IN (1, 2)",
+    "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o ON t.OrderId = o.Id WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.Id, tt.Name FROM Tasks t JOIN Orders o ON t.OrderId = o.Id "
+    "LEFT JOIN TaskTypes tt ON t.TaskTypeId = tt.Id WHERE o.ServiceTeamId = 1",
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND EXISTS (SELECT 1 FROM Tasks t WHERE t.OrderId = o.Id)",
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND o.TransfereeId IN (SELECT o2.TransfereeId FROM Orders o2 WHERE o2.ServiceTeamId IN (2))",
+    "WITH scoped AS (SELECT o.Id FROM Orders o WHERE o.ServiceTeamId IN (1)) "
+    "SELECT TOP 5 t.* FROM Tasks t JOIN scoped s ON t.OrderId = s.Id "
+    "JOIN Orders o ON t.OrderId = o.Id WHERE o.ServiceTeamId IN (1)",
+    "SELECT COUNT(*) FROM (SELECT o.Id FROM Orders o WHERE o.ServiceTeamId IN (1)) d",
+]
+
+LEAKING = [
+    # other teams' orders through an unfiltered alias
+    "SELECT TOP 5 o2.* FROM Orders o1 JOIN Orders o2 ON o1.TransfereeId = o2.TransfereeId "
+    "WHERE o1.ServiceTeamId IN (1)",
+    # every team's Tasks through joins without a join condition
+    "SELECT TOP 5 t.* FROM Tasks t, Orders o WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o ON 1=1 WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.* FROM Tasks t CROSS JOIN Orders o WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o USING (Id) WHERE o.ServiceTeamId IN (1)",
+    # join conditions that do not link the joined table, or not through a foreign key
+    "SELECT TOP 5 t2.* FROM Tasks t JOIN Orders o ON t.OrderId = o.Id JOIN Tasks t2 ON t.OrderId = o.Id "
+    "WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o ON t.Id = o.Id WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o ON t.OrderId = o.Id OR 1 = 1 WHERE o.ServiceTeamId IN (1)",
+    # data exfiltrated through subqueries in filters
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND 1 = CAST((SELECT TOP 1 Email FROM ApplicationUsers) AS INT)",
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND EXISTS (SELECT 1 FROM ApplicationUsers u WHERE u.Email LIKE 'a%')",
+    "SELECT o.ServiceTeamId, COUNT(*) FROM Orders o WHERE o.ServiceTeamId IN (1) GROUP BY o.ServiceTeamId "
+    "HAVING COUNT(*) > (SELECT COUNT(*) FROM Orders o2 WHERE o2.ServiceTeamId IN (3))",
+    "SELECT TOP 5 o.Id FROM Orders o JOIN Tasks t ON t.OrderId = o.Id "
+    "AND t.Id IN (SELECT Id FROM Tasks) WHERE o.ServiceTeamId IN (1)",
+    # correlated subqueries must link to the scoped tables
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND EXISTS (SELECT 1 FROM Tasks t WHERE t.Id = o.Id)",
+    # scalar subqueries in the select list
+    "SELECT TOP 5 o.Id, (SELECT TOP 1 Email FROM ApplicationUsers) FROM Orders o WHERE o.ServiceTeamId IN (1)",
+    # foreign or missing ServiceTeamIds
+    "SELECT TOP 5 * FROM Orders WHERE ServiceTeamId IN (1, 3)",
+    "SELECT TOP 5 * FROM Orders WHERE ServiceTeamId IN (1) OR 1 = 1",
+    "SELECT TOP 5 * FROM Tasks",
+    "DELETE FROM Orders WHERE ServiceTeamId IN (1)",
+    # rowset functions, other databases and user-defined functions
+    "SELECT TOP 5 * FROM OPENQUERY(srv, 'select * from Orders') WHERE ServiceTeamId IN (1)",
+    "SELECT TOP 5 x.* FROM Orders o JOIN OPENQUERY(srv, 'select * from Tasks') x ON x.OrderId = o.Id "
+    "WHERE o.ServiceTeamId IN (1)",
+    "SELECT TOP 5 o.Id FROM Orders o WHERE o.ServiceTeamId IN (1) "
+    "AND EXISTS (SELECT 1 FROM OPENROWSET('SQLNCLI', 'Server=x;', 'select 1') r)",
+    "SELECT TOP 5 * FROM otherdb.dbo.Orders WHERE ServiceTeamId IN (1)",
+    "SELECT TOP 5 o.Id, dbo.leak() FROM Orders o WHERE o.ServiceTeamId IN (1)",
+]
+
+@pytest.mark.parametrize("query", SCOPED)
+def test_scoped_queries_pass(query):
+    result = check_guarantees(query, IDS)
+    assert result.status == OK, result.message
+
+@pytest.mark.parametrize("query", LEAKING)
+def test_leaking_queries_are_rejected(query):
+    assert check_guarantees(query, IDS).status == INVALID
+
+def test_catalog_foreign_keys_extend_known_joins():
+    query = (
+        "SELECT TOP 5 n.* FROM Notes n JOIN Orders o ON n.OrderId = o.Id WHERE o.ServiceTeamId IN (1)"
+    )
+    assert check_guarantees(query, IDS).status == INVALID
+    assert check_guarantees(query, IDS, foreign_keys=[("Notes", "OrderId", "Orders", "Id")]).status == OK
+
+def test_validate_query_rejects_unknown_joins():
+    query = "SELECT TOP 5 t.* FROM Tasks t JOIN Orders o ON t.Id = o.Id WHERE o.ServiceTeamId IN (1)"
+    assert validate_query(query, IDS).status == INVALID
+
+def test_validate_query_requires_row_limit():
+    assert validate_query("SELECT * FROM Orders WHERE ServiceTeamId IN (1)", IDS).status == INVALID
+
+def test_cte_shadowing_its_table_is_checked_against_the_table():
+    shadowing = (
+        "WITH Orders AS (SELECT * FROM Orders WHERE ServiceTeamId IN ({})) "
+        "SELECT TOP 5 * FROM Orders WHERE ServiceTeamId IN (1)"
+    )
+    assert check_guarantees(shadowing.format(1), IDS).status == OK
+    assert check_guarantees(shadowing.format(3), IDS).status == INVALID
+    assert validate_query(shadowing.format(1), IDS).status == OK
+
+def test_queries_the_guard_fails_on_are_rejected():
+    nested = "SELECT TOP 5 * FROM Orders WHERE ServiceTeamId IN (1)"
+    for _ in range(400):
+        nested = f"SELECT TOP 5 * FROM ({nested}) d"
+    assert check_guarantees(nested, IDS).status == INVALID
+    assert validate_query(nested, IDS).status == INVALID
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src import storage
+from src.storage import SqliteStorage, dumps, loads
+
+@pytest.fixture
+def state(tmp_path):
+    store = SqliteStorage(str(tmp_path / "state" / "turns.db"))
+    yield store
+    store.close()
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_small_values_are_pickled_without_compression():
+    value = {"conversation": {"history": ["hi"]}}
+    data = dumps(value)
+    assert data[:1] == b"p"
+    assert loads(data) == value
+
+def test_large_values_round_trip_through_zlib():
+    value = {"conversation": {"history": ["SELECT * FROM orders"] * 500}}
+    data = dumps(value)
+    assert data[:1] == b"z"
+    assert len(data) < storage.COMPRESS_THRESHOLD * 2
+    assert loads(data) == value
+
+def test_read_returns_written_items_with_an_e_tag(state):
+    run(state.write({"conv/1": {"history": ["SELECT 1"] * 500}}))
+    item = run(state.read(["conv/1", "conv/missing"]))
+    assert list(item) == ["conv/1"]
+    assert item["conv/1"]["history"] == ["SELECT 1"] * 500
+    assert item["conv/1"]["e_tag"]
+
+def test_stale_e_tag_write_conflicts(state):
+    run(state.write({"conv/1": {"turn": 0}}))
+    first = run(state.read(["conv/1"]))["conv/1"]
+    second = run(state.read(["conv/1"]))["conv/1"]
+
+    first["turn"] = 1
+    run(state.write({"conv/1": first}))
+    second["turn"] = 2
+    with pytest.raises(KeyError, match="Etag conflict"):
+        run(state.write({"conv/1": second}))
+    assert run(state.read(["conv/1"]))["conv/1"]["turn"] == 1
+
+    # "*" overwrites whatever is stored
+    second["e_tag"] = "*"
+    run(state.write({"conv/1": second}))
+    assert run(state.read(["conv/1"]))["conv/1"]["turn"] == 2
+
+def test_conflict_rolls_back_the_whole_batch(state):
+    run(state.write({"conv/1": {"turn": 0}}))
+    stale = run(state.read(["conv/1"]))["conv/1"]
+    run(state.write({"conv/1": dict(stale)}))
+    with pytest.raises(KeyError):
+        run(state.write({"conv/2": {"turn": 0}, "conv/1": stale}))
+    assert run(state.read(["conv/2"])) == {}
+
+def test_expired_items_are_missing_and_purged(state, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(storage.time, "time", lambda: now)
+    run(state.write({"conv/old": {"turn": 0}}))
+    now += state.ttl / 2
+    run(state.write({"conv/new": {"turn": 0}}))
+
+    now += state.ttl / 2
+    assert list(run(state.read(["conv/old", "conv/new"]))) == ["conv/new"]
+    assert state.purge() == 1
+    assert state.purge() == 0
+    assert list(run(state.read(["conv/old", "conv/new"]))) == ["conv/new"]